@@ -0,0 +1,255 @@
+"""
+Audit Logs
+-------------------------------
+
+change_log.txt (profile edits) and deactivation_log.txt (accounts turned
+off and back on) are written as one compact JSON line per entry:
+
+    {"acc":"2004","ts":1747000000,"event":"change","field":"Name","old":"BAASIT","new":"BAASITH"}
+    {"acc":"2004","ts":1747000000,"event":"deactivate","reason":"bad"}
+    {"acc":"2004","ts":1747000000,"event":"restore"}
+
+Old lines ("2004 - Name changed from X to Y" and
+"2004 | Deactivated on ... | Reason: ...") are still read.
+
+The logs are kept small:
+
+- a log is archived when it grows past BANK_AUDIT_MAX_KB (1024 by
+  default) or when it still holds entries from an earlier month
+- archives are gzipped into audit/<log>-YYYYMMDD-HHMMSS.txt.gz
+- audit/index.txt gets one "accNo|archive|entries" line per account in
+  each new archive, so the history of one customer only opens the
+  archives that mention them
+"""
+
+
+import datetime
+import os
+import time
+
+import datacache
+from metrics import openFile
+from tailer import LogTail
+
+
+AUDIT_DIR = "audit"
+INDEX_FILE = os.path.join(AUDIT_DIR, "index.txt")
+LOGS = {"change": "change_log.txt", "deactivation": "deactivation_log.txt"}
+MAX_BYTES = int(float(os.environ.get("BANK_AUDIT_MAX_KB", "1024")) * 1024)
+
+# compiled (and cached) by re on the first old line read
+LEGACY_CHANGE = r"^(\S+) - (\w+) changed from (.*?) to (.*)$"
+
+indexTail = LogTail(INDEX_FILE)
+accountArchives = {}
+
+
+def parseLegacy(line):
+    import re
+
+    line = line.rstrip("\n")
+    match = re.match(LEGACY_CHANGE, line)
+    if match:
+        accNo, field, old, new = match.groups()
+        return {"acc": accNo, "ts": None, "event": "change", "field": field, "old": old, "new": new}
+
+    parts = line.split(" | ")
+    if len(parts) == 3 and parts[1].startswith("Deactivated on "):
+        import ledger
+
+        try:
+            epoch = ledger.stampToEpoch(parts[1][15:34])
+        except ValueError:
+            epoch = None
+        reason = parts[2][8:] if parts[2].startswith("Reason: ") else parts[2]
+        return {"acc": parts[0], "ts": epoch, "event": "deactivate", "reason": reason}
+    return None
+
+
+'''
+Turns one log line, in either format, into a dict. Returns None for
+blank or broken lines.
+'''
+
+def parseEntry(line):
+    if line.startswith("{"):
+        import json
+
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        return entry if "acc" in entry else None
+    return parseLegacy(line)
+
+
+def entryMonth(line):
+    entry = parseEntry(line)
+    if entry is None or entry.get("ts") is None:
+        return ""
+    return time.strftime("%Y-%m", time.localtime(entry["ts"]))
+
+
+def needsRotation(path):
+    try:
+        if os.path.getsize(path) > MAX_BYTES:
+            return True
+        with openFile(path, "r") as f:
+            month = entryMonth(f.readline())
+    except FileNotFoundError:
+        return False
+    return bool(month) and month < datetime.date.today().strftime("%Y-%m")
+
+
+def archiveName(log):
+    stem = LOGS[log][:-4]
+    base = f"{stem}-{time.strftime('%Y%m%d-%H%M%S')}"
+    name = base + ".txt.gz"
+    counter = 1
+    while os.path.exists(os.path.join(AUDIT_DIR, name)):
+        counter += 1
+        name = f"{base}-{counter}.txt.gz"
+    return name
+
+
+'''
+Moves a log into a gzip archive and adds its accounts to the index.
+The log is renamed out of the way first, so entries written while the
+archive is being made simply start a new log. A renamed log left behind
+by a rotation that was cut short is archived first, so it is not
+overwritten. Returns how many entries were archived.
+'''
+
+def rotate(log):
+    path = LOGS[log]
+    os.makedirs(AUDIT_DIR, exist_ok=True)
+    rotating = path + ".rotating"
+    moved = 0
+    if os.path.exists(rotating):
+        moved += archiveFile(log, rotating)
+    try:
+        os.replace(path, rotating)
+    except FileNotFoundError:
+        return moved
+    return moved + archiveFile(log, rotating)
+
+
+def archiveFile(log, rotating):
+    import gzip
+
+    counts = {}
+    name = archiveName(log)
+    tempPath = os.path.join(AUDIT_DIR, name + ".tmp")
+    with openFile(rotating, "r") as source, gzip.open(tempPath, "wt") as archive:
+        for line in source:
+            archive.write(line)
+            entry = parseEntry(line)
+            if entry is not None:
+                counts[entry["acc"]] = counts.get(entry["acc"], 0) + 1
+    os.replace(tempPath, os.path.join(AUDIT_DIR, name))
+
+    with openFile(INDEX_FILE, "a") as index:
+        index.write("".join(f"{accNo}|{name}|{count}\n" for accNo, count in counts.items()))
+    os.remove(rotating)
+    return sum(counts.values())
+
+
+def rotateAll(force=False):
+    moved = 0
+    for log, path in LOGS.items():
+        if force or needsRotation(path):
+            moved += rotate(log)
+    return moved
+
+
+'''
+Adds entries (dicts with at least "acc" and "event") to a log, first
+archiving the log if it is too big or from an earlier month.
+'''
+
+def record(log, entries):
+    import json
+
+    if not entries:
+        return
+    path = LOGS[log]
+    if needsRotation(path):
+        rotate(log)
+    now = int(time.time())
+    lines = []
+    for entry in entries:
+        entry.setdefault("ts", now)
+        lines.append(json.dumps(entry, separators=(",", ":")) + "\n")
+    datacache.appendLines(path, lines)
+
+
+def logChange(accNo, field, old, new):
+    record("change", [{"acc": accNo, "event": "change", "field": field, "old": old, "new": new}])
+
+
+def logDeactivation(accNo, reason):
+    record("deactivation", [{"acc": accNo, "event": "deactivate", "reason": reason}])
+
+
+def logRestore(accNo):
+    record("deactivation", [{"acc": accNo, "event": "restore"}])
+
+
+'''
+{accNo: [archive names]}, kept up to date by following the index file.
+'''
+
+def accountIndex():
+    newLines, reset = indexTail.poll()
+    if reset:
+        accountArchives.clear()
+    for line in newLines:
+        parts = line.rstrip("\n").split("|")
+        if len(parts) == 3:
+            accountArchives.setdefault(parts[0], []).append(parts[1])
+    return accountArchives
+
+
+'''
+Every audit entry for one account, oldest first: the archives that
+mention it (found through the index) followed by the current logs.
+'''
+
+def history(accNo):
+    import gzip
+
+    found = []
+    for name in accountIndex().get(accNo, []):
+        try:
+            with gzip.open(os.path.join(AUDIT_DIR, name), "rt") as f:
+                for line in f:
+                    entry = parseEntry(line)
+                    if entry is not None and entry["acc"] == accNo:
+                        found.append(entry)
+        except FileNotFoundError:
+            continue
+
+    jsonMarker = f'"acc":"{accNo}"'
+    for path in LOGS.values():
+        try:
+            lines = datacache.lines(path)
+        except FileNotFoundError:
+            continue
+        for line in lines:
+            if line.startswith(accNo + " ") or jsonMarker in line:
+                entry = parseEntry(line)
+                if entry is not None and entry["acc"] == accNo:
+                    found.append(entry)
+
+    found.sort(key=lambda entry: entry.get("ts") or 0)
+    return found
+
+
+def describe(entry):
+    if entry["event"] == "change":
+        return f"{entry.get('field')} changed from {entry.get('old')} to {entry.get('new')}"
+    if entry["event"] == "deactivate":
+        return f"Deactivated. Reason: {entry.get('reason', '')}"
+    if entry["event"] == "restore":
+        return "Restored to Active"
+    return entry["event"]
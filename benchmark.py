@@ -0,0 +1,344 @@
+"""
+Benchmark Harness
+-------------------------------
+
+Times the main banking operations against a generated data set and
+prints the results as JSON (p50/p99 latency in milliseconds and ops/sec),
+so runs can be saved and compared over time.
+
+The real functions from banking_app.py are called. Their prompts are
+answered from a script instead of the keyboard and their screen output
+is thrown away.
+
+Operations timed
+- login
+- checkBalance
+- deposit
+- transferMoney
+- viewTransactions (full history, and the last month only)
+- searchCustomerBy (NIC and phone)
+- applyMonthlyInterest
+- startup (process launch until the first startMenu prompt appears),
+  both as "python banking_app.py" and as "python -m banking_app"
+
+Usage:
+    python benchmark.py --size 10k
+    python benchmark.py --data bench_data/100k --iterations 100 --output results.json
+
+A --data folder is copied to a scratch folder first, so the benchmark
+never changes the original files.
+
+Every run is checked after it is timed: it failed if it printed an
+error (the app prints those in red), if a login did not log in, or if a
+deposit or transfer did not move the balances by its amount. Each
+operation reports how many of its runs failed, and a warning is printed
+for any that had failures, since their timings are not of the real
+work.
+"""
+
+
+import argparse
+import glob
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import generate_data
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# operations that are slow by design get fewer runs
+ITERATION_CAPS = {
+    "login": 20,
+    "applyMonthlyInterest": 5,
+}
+
+
+'''
+Feeds prepared answers to input() calls, one after another.
+'''
+
+class ScriptedInput:
+
+    def __init__(self):
+        self.answers = []
+
+    def load(self, *answers):
+        self.answers = list(answers)
+
+    def __call__(self, prompt=""):
+        if not self.answers:
+            raise EOFError("benchmark script ran out of answers")
+        return self.answers.pop(0)
+
+
+'''
+Stands in for the screen while an operation runs: the output is thrown
+away, but error lines are counted.
+'''
+
+class OutputWatch:
+
+    def __init__(self, marker):
+        self.marker = marker
+        self.errors = 0
+
+    def write(self, text):
+        if self.marker in text:
+            self.errors += 1
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def percentile(sortedValues, pct):
+    if not sortedValues:
+        return 0.0
+    rank = math.ceil(pct / 100.0 * len(sortedValues))
+    return sortedValues[min(max(rank, 1), len(sortedValues)) - 1]
+
+
+'''
+Runs one operation a number of times and turns the timings into
+the numbers we report. check, when given, is called after each run
+(untimed) with what run returned, and says if the run did its work.
+'''
+
+def timeOperation(prepare, run, iterations, check=None):
+    timings = []
+    failed = 0
+    for _ in range(iterations):
+        prepare()
+        start = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - start)
+        if check is not None and not check(result):
+            failed += 1
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "mean_ms": round(total / iterations * 1000, 3),
+        "ops_per_sec": round(iterations / total, 2) if total > 0 else None,
+        "failed": failed,
+    }
+
+
+'''
+Runs every benchmark inside dataDir (which gets changed) and returns
+a dict of results keyed by operation name.
+'''
+
+def runBenchmarks(dataDir, iterations, password, seed=7):
+    os.chdir(dataDir)
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+
+    import banking_app as app
+
+    rng = random.Random(seed)
+    scripted = ScriptedInput()
+    app.input = scripted
+    app.readPassword = scripted
+
+    # through the app, so a sharded data folder works too
+    profiles = list(app.shards.rows("CustomerProfiles.txt"))
+    activeAccounts = [profile.accNo for profile in profiles if profile.status == "Active"]
+    sampleProfiles = [rng.choice(profiles) for _ in range(100)]
+    with open("interestlog.txt", "r") as f:
+        interestLog = f.read()
+
+    # the last month of generated history, which sits in the newest segment
+    recent = max((line.split("|")[1][:7] for line in open("interestlog.txt") if "|" in line), default="")
+
+    def pick():
+        return rng.choice(activeAccounts)
+
+    def pickPair():
+        fromAcc = pick()
+        toAcc = pick()
+        while toAcc == fromAcc and len(activeAccounts) > 1:
+            toAcc = pick()
+        return fromAcc, toAcc
+
+    def nothing():
+        pass
+
+    def resetInterestLog():
+        with open("interestlog.txt", "w") as f:
+            f.write(interestLog)
+
+    watch = OutputWatch(app.Fore.RED)
+    # the accounts and balances of the run being timed
+    chosen = {}
+
+    def balance(accNo):
+        return app.shards.lookup("AccountDetails.txt", accNo).balance
+
+    def choose(*accNos):
+        chosen.update(accNos=accNos, before=[balance(accNo) for accNo in accNos])
+        return accNos
+
+    def printedNoError(result=None):
+        return watch.errors == chosen["errors"]
+
+    def moved(*amounts):
+        def check(result):
+            after = [balance(accNo) for accNo in chosen["accNos"]]
+            return printedNoError() and all(abs(new - old - amount) < 0.005
+                                            for old, new, amount in zip(chosen["before"], after, amounts))
+        return check
+
+    def loggedIn(result):
+        return printedNoError() and result is not None
+
+    def prepared(load):
+        def prepare():
+            chosen["errors"] = watch.errors
+            load()
+        return prepare
+
+    benchmarks = {
+        "login": (lambda: scripted.load("user" + pick(), password), app.login, loggedIn),
+        "checkBalance": (lambda: scripted.load(pick()), lambda: app.checkBalance("admin"), printedNoError),
+        "deposit": (lambda: scripted.load(*choose(pick()), "100", ""), lambda: app.deposit("admin"), moved(100)),
+        "transferMoney": (lambda: scripted.load(*choose(*pickPair()), "1", ""), lambda: app.transferMoney("admin"),
+                          moved(-1, 1)),
+        "viewTransactions": (lambda: scripted.load(pick(), ""), lambda: app.viewTransactions("admin"), printedNoError),
+        "viewTransactions_recent": (lambda: scripted.load(pick(), recent), lambda: app.viewTransactions("admin"),
+                                    printedNoError),
+        "searchCustomerBy_nic": (nothing, lambda: app.searchCustomerBy("nic", rng.choice(sampleProfiles).nic),
+                                 printedNoError),
+        "searchCustomerBy_phone": (nothing, lambda: app.searchCustomerBy("phone", rng.choice(sampleProfiles).phone),
+                                   printedNoError),
+        "applyMonthlyInterest": (resetInterestLog, app.applyMonthlyInterest, printedNoError),
+    }
+
+    results = {}
+    stdout = sys.stdout
+    for name, (prepare, run, check) in benchmarks.items():
+        count = min(iterations, ITERATION_CAPS.get(name, iterations))
+        prepare = prepared(prepare)
+        sys.stdout = watch
+        try:
+            # one untimed warm-up so the first run does not pay for imports
+            prepare()
+            run()
+            results[name] = timeOperation(prepare, run, count, check)
+        finally:
+            sys.stdout = stdout
+        print(f"  {name:<24} p50 {results[name]['p50_ms']:>10} ms   p99 {results[name]['p99_ms']:>10} ms",
+              file=sys.stderr)
+        if results[name]["failed"]:
+            print(f"  warning: {results[name]['failed']} of {count} {name} runs failed", file=sys.stderr)
+
+    return results
+
+
+'''
+Starts banking_app.py as a fresh process again and again and times how
+long it takes for the first startMenu prompt to show up on its output.
+'''
+
+def timeStartup(dataDir, runs, asModule=False, prompt=b"Press Enter"):
+    env = dict(os.environ)
+    if asModule:
+        command = [sys.executable, "-m", "banking_app"]
+        env["PYTHONPATH"] = HERE + os.pathsep + env.get("PYTHONPATH", "")
+    else:
+        command = [sys.executable, os.path.join(HERE, "banking_app.py")]
+
+    def launch():
+        process = subprocess.Popen(command, cwd=dataDir, env=env,
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        seen = b""
+        try:
+            while prompt not in seen:
+                chunk = os.read(process.stdout.fileno(), 4096)
+                if not chunk:
+                    raise RuntimeError("banking_app.py exited before showing its prompt")
+                seen += chunk
+        finally:
+            process.kill()
+            process.wait()
+            process.stdout.close()
+            process.stdin.close()
+
+    launch()
+    return timeOperation(lambda: None, launch, runs)
+
+
+def countLines(fileName):
+    with open(fileName, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the banking app's hot paths.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--size", choices=sorted(generate_data.SIZES), help="generate a data set of this size")
+    source.add_argument("--accounts", type=int, help="generate a data set with this many accounts")
+    source.add_argument("--data", help="existing data folder (copied before use)")
+    parser.add_argument("--txns-per-account", type=int, default=12)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--startup-runs", type=int, default=20, help="cold starts to time (0 to skip)")
+    parser.add_argument("--password", default="bench", help="password of the generated logins")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bank_bench_")
+    try:
+        if args.data:
+            # the whole tree: a sharded folder keeps its accounts under shards/
+            shutil.copytree(args.data, scratch, dirs_exist_ok=True)
+            dataset = {"source": os.path.abspath(args.data)}
+        else:
+            accounts = args.accounts or generate_data.SIZES[args.size]
+            print(f"Generating {accounts} accounts...", file=sys.stderr)
+            dataset = generate_data.generateDataset(scratch, accounts, args.txns_per_account)
+
+        accountFiles = [os.path.join(scratch, "AccountDetails.txt")]
+        accountFiles += glob.glob(os.path.join(scratch, "shards", "*", "AccountDetails.txt"))
+        dataset["account_lines"] = sum(countLines(path) for path in accountFiles if os.path.exists(path))
+        dataset["transaction_lines"] = countLines(os.path.join(scratch, "transactions.txt"))
+
+        results = runBenchmarks(scratch, args.iterations, args.password)
+        if args.startup_runs > 0:
+            results["startup"] = timeStartup(scratch, args.startup_runs)
+            results["startup_module"] = timeStartup(scratch, args.startup_runs, asModule=True)
+            for name in ("startup", "startup_module"):
+                print(f"  {name:<24} p50 {results[name]['p50_ms']:>10} ms   p99 {results[name]['p99_ms']:>10} ms",
+                      file=sys.stderr)
+    finally:
+        os.chdir(HERE)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": dataset,
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Data File Cache
+-------------------------------
+
+Keeps the data files parsed in memory, so going back to the menu and
+picking another option does not read and split the same file again.
+
+    AccountDetails.txt                                         records.Account
+    CustomerProfiles.txt                                       records.Profile
+    interestlog.txt                                            rows split on "|"
+    credentials.txt                                            rows split on ":"
+    transactions.txt, change_log.txt, deactivation_log.txt     raw lines
+
+- before a cached copy is used the file is stat'ed; if its inode, size
+  or modification time changed (another process wrote to it, or the
+  ledger was rotated) it is read again
+- the append-only logs are followed with a LogTail (see tailer.py), so
+  when they grew only the new lines are read and added
+- writes made through this module (rewriteRows, updateRows, appendRows,
+  appendLines) update the cached copy as well, so our own changes never
+  cause a re-read
+- whole-file rewrites go to a temporary file that then replaces the
+  real one, so other readers see either the old file or the new one,
+  never a half-written one
+- the cached files together are kept under a memory budget
+  (BANK_CACHE_MB, 256 by default); when it is exceeded the least
+  recently used file is dropped
+- a file too big for the budget on its own is never cached. Looking up
+  one row of it then reads the file line by line and stops at the
+  first match, instead of parsing all of it on every lookup, and
+  updateRows copies it line by line to the temporary file, swapping in
+  the changed rows. Getting all the rows still reads the whole file
+  each time, so keep the budget
+  above the biggest file that is scanned often: parsed rows take about
+  SIZE_FACTORS times the file size (see records.py for measured sizes;
+  256 MB fits AccountDetails.txt up to about 1M accounts)
+
+Rows handed out belong to the cache: copy a row before changing it and
+pass the new version back through updateRows.
+"""
+
+
+import os
+from collections import OrderedDict
+
+import records
+from metrics import openFile
+from tailer import LogTail
+
+
+DELIMITERS = {
+    "AccountDetails.txt": "|",
+    "CustomerProfiles.txt": "|",
+    "interestlog.txt": "|",
+    "credentials.txt": ":",
+    "transactions.txt": None,
+    "change_log.txt": None,
+    "deactivation_log.txt": None,
+}
+
+# files whose rows are records (see records.py); lines that do not fit are left out
+RECORDS = {
+    "AccountDetails.txt": records.Account,
+    "CustomerProfiles.txt": records.Profile,
+}
+
+APPEND_ONLY = {"transactions.txt", "interestlog.txt", "change_log.txt", "deactivation_log.txt"}
+
+# parsed rows take roughly this many times the file size in memory
+SIZE_FACTOR = 10
+SIZE_FACTORS = {
+    "AccountDetails.txt": 8,
+    "CustomerProfiles.txt": 5,
+}
+
+budget = int(float(os.environ.get("BANK_CACHE_MB", "256")) * 1024 * 1024)
+entries = OrderedDict()
+stats = {"hits": 0, "misses": 0, "tails": 0, "evictions": 0, "scans": 0}
+
+
+def signature(path):
+    info = os.stat(path)
+    return info.st_ino, info.st_size, info.st_mtime_ns
+
+
+class Entry:
+
+    def __init__(self, path, rows, sig):
+        self.path = path
+        self.rows = rows
+        self.sig = sig
+        self.cost = sig[1] * sizeFactor(path)
+        self.keys = None
+        self.tail = None
+
+    '''
+    {first field: row position}, built the first time a row is looked
+    up by key. The first row wins, like the old line-by-line scans.
+    '''
+
+    def index(self):
+        if self.keys is None:
+            keys = {}
+            for position, row in enumerate(self.rows):
+                key = rowKey(self.path, row)
+                if key not in keys:
+                    keys[key] = position
+            self.keys = keys
+        return self.keys
+
+
+'''
+Which data file a path is, so a shard's copy (shards/01/AccountDetails.txt,
+see shards.py) is parsed like the top-level file.
+'''
+
+def kind(path):
+    return os.path.basename(path)
+
+
+def sizeFactor(path):
+    return SIZE_FACTORS.get(kind(path), SIZE_FACTOR)
+
+
+def rowKey(path, row):
+    return row.accNo if kind(path) in RECORDS else row[0]
+
+
+def parse(path, lines):
+    delimiter = DELIMITERS.get(kind(path), "|")
+    if delimiter is None:
+        return list(lines)
+    rows = []
+    record = RECORDS.get(kind(path))
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        parts = line.split(delimiter)
+        if record is None:
+            rows.append(parts)
+        else:
+            parts = record.fromParts(parts)
+            if parts is not None:
+                rows.append(parts)
+    return rows
+
+
+def store(entry):
+    entries.pop(entry.path, None)
+    if entry.cost > budget:
+        return entry
+    entries[entry.path] = entry
+    used = sum(item.cost for item in entries.values())
+    while used > budget:
+        _, evicted = entries.popitem(last=False)
+        used -= evicted.cost
+        stats["evictions"] += 1
+    return entry
+
+
+'''
+Returns the cached Entry for a data file, reading it again if it
+changed on disk. Raises FileNotFoundError like open() would.
+'''
+
+def load(path):
+    sig = signature(path)
+    entry = entries.get(path)
+    if entry is not None and entry.sig == sig:
+        entries.move_to_end(path)
+        stats["hits"] += 1
+        return entry
+
+    if path in APPEND_ONLY:
+        return follow(path, entry, sig)
+
+    stats["misses"] += 1
+    with openFile(path, "r") as f:
+        rows = parse(path, f)
+    # keep the signature from before the read: if the file changed while
+    # we were reading it, the next load sees a difference and reads it again
+    return store(Entry(path, rows, sig))
+
+
+'''
+Brings an append-only file up to date by reading only the lines added
+since last time, or the whole file if it was replaced or rewritten.
+'''
+
+def follow(path, entry, sig):
+    if entry is None:
+        entry = Entry(path, [], sig)
+        entry.tail = LogTail(path)
+
+    newLines, reset = entry.tail.poll()
+    if reset:
+        stats["misses"] += 1
+        entry.rows = parse(path, newLines)
+        entry.keys = None
+    else:
+        stats["tails"] += 1
+        added = parse(path, newLines)
+        start = len(entry.rows)
+        entry.rows.extend(added)
+        if entry.keys is not None:
+            for position in range(start, len(entry.rows)):
+                entry.keys.setdefault(rowKey(path, entry.rows[position]), position)
+
+    entry.sig = sig
+    entry.cost = entry.tail.offset * sizeFactor(path)
+    return store(entry)
+
+
+def rows(path):
+    return load(path).rows
+
+
+def lines(path):
+    return load(path).rows
+
+
+def tooBig(path):
+    return os.stat(path).st_size * sizeFactor(path) > budget
+
+
+def uncached(path):
+    return path not in entries and DELIMITERS.get(kind(path), "|") is not None and tooBig(path)
+
+
+'''
+Finds the row for key in a file that is not kept in the cache, reading
+up to the first line that starts with it and parsing only that line.
+'''
+
+def scan(path, key):
+    stats["scans"] += 1
+    prefix = key + DELIMITERS.get(kind(path), "|")
+    with openFile(path, "r") as f:
+        for line in f:
+            if line.startswith(prefix):
+                found = parse(path, [line])
+                if found:
+                    return found[0]
+    return None
+
+
+'''
+The row whose first field is key (an account number or a username),
+or None.
+'''
+
+def lookup(path, key):
+    if uncached(path):
+        return scan(path, key)
+    entry = load(path)
+    position = entry.index().get(key)
+    return None if position is None else entry.rows[position]
+
+
+def invalidate(path=None):
+    if path is None:
+        entries.clear()
+    else:
+        entries.pop(path, None)
+
+
+def formatRows(path, newRows):
+    delimiter = DELIMITERS.get(kind(path), "|")
+    if kind(path) in RECORDS:
+        return RECORDS[kind(path)].formatLines(newRows)
+    return "".join(delimiter.join(row) + "\n" for row in newRows)
+
+
+def writeAtomically(path, text):
+    tempPath = path + ".tmp"
+    with openFile(tempPath, "w") as f:
+        f.write(text)
+    os.replace(tempPath, path)
+
+
+'''
+Replaces the whole file with the given rows.
+'''
+
+def rewriteRows(path, newRows):
+    writeAtomically(path, formatRows(path, newRows))
+    store(Entry(path, newRows, signature(path)))
+
+
+'''
+Rewrites a file that is not kept in the cache, copying it line by line
+and putting the new row in place of the first line for each key. Raises
+KeyError (and leaves the file alone) if a key is not in it.
+'''
+
+def rewriteScanned(path, changed):
+    stats["scans"] += 1
+    delimiter = DELIMITERS.get(kind(path), "|")
+    remaining = dict(changed)
+    tempPath = path + ".tmp"
+    with openFile(path, "r") as source, openFile(tempPath, "w") as target:
+        for line in source:
+            key = line.split(delimiter, 1)[0]
+            if key in remaining:
+                line = formatRows(path, [remaining.pop(key)])
+            target.write(line)
+    if remaining:
+        os.remove(tempPath)
+        raise KeyError(next(iter(remaining)))
+    os.replace(tempPath, path)
+
+
+'''
+Replaces existing rows by key ({key: new row}) and rewrites the file.
+The row order and the key index stay as they were.
+'''
+
+def updateRows(path, changed):
+    if uncached(path):
+        rewriteScanned(path, changed)
+        return
+    entry = load(path)
+    keys = entry.index()
+    newRows = list(entry.rows)
+    for key, row in changed.items():
+        newRows[keys[key]] = row
+    writeAtomically(path, formatRows(path, newRows))
+    updated = Entry(path, newRows, signature(path))
+    updated.keys = keys
+    store(updated)
+
+
+def appendText(path, text, added):
+    try:
+        before = signature(path)
+    except FileNotFoundError:
+        before = None
+    with openFile(path, "a") as f:
+        f.write(text)
+
+    entry = entries.get(path)
+    if path in APPEND_ONLY:
+        if entry is not None:
+            follow(path, entry, signature(path))
+        return
+
+    if entry is None or entry.sig != before:
+        entries.pop(path, None)
+        return
+    entry.rows.extend(added)
+    if entry.keys is not None:
+        for position in range(len(entry.rows) - len(added), len(entry.rows)):
+            entry.keys.setdefault(rowKey(path, entry.rows[position]), position)
+    entry.sig = signature(path)
+    entry.cost = entry.sig[1] * sizeFactor(path)
+    store(entry)
+
+
+def appendRows(path, newRows):
+    appendText(path, formatRows(path, newRows), newRows)
+
+
+def appendLines(path, newLines):
+    appendText(path, "".join(newLines), newLines)
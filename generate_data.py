@@ -0,0 +1,246 @@
+"""
+Synthetic Data Generator
+-------------------------------
+
+Writes a full set of banking data files with made-up customers so the
+app (and benchmark.py) can be tried against a bank much bigger than the
+sample data.
+
+Files written into the output folder
+- AccountDetails.txt     - account number, name, and closing balance
+- CustomerProfiles.txt   - NIC, DOB, phone, email, address, gender, type, status
+- credentials.txt        - one login per customer plus an admin login
+- transactions.txt       - opening balances, deposits, withdrawals, transfers, interest
+- interestlog.txt        - monthly interest history for savings accounts
+- change_log.txt         - empty
+- deactivation_log.txt   - one line for every inactive customer
+
+Every login (including admin) uses the same password (default "bench"),
+hashed once with bcrypt. Hashing a million passwords would take hours and
+tells us nothing new.
+
+The balances in AccountDetails.txt always match what the transactions add
+up to, and activity stops the month before the current one, so
+applyMonthlyInterest still has a full month of work to do.
+
+Usage:
+    python generate_data.py --size 100k --out bench_data/100k
+    python generate_data.py --accounts 2500 --txns-per-account 40 --out small
+"""
+
+
+import argparse
+import datetime
+import os
+import random
+
+
+SIZES = {
+    "10k": 10000,
+    "100k": 100000,
+    "1m": 1000000,
+}
+
+FIRST_ACCOUNT = 2004
+MONTHLY_RATE = 0.03 / 12
+
+FIRST_NAMES = ["BAASITH", "SANEEJ", "SHIMA", "MUNSI", "FATHIMA", "AHAMED", "NIMAL", "KASUN",
+               "DILANI", "THARINDU", "SAMAN", "RUWAN", "NUWAN", "HASINI", "ISHARA", "ZAHRA",
+               "RIZWAN", "AMAL", "PRIYA", "KAVYA", "SURESH", "MOHAMED", "NADEESHA", "ROSHAN"]
+LAST_NAMES = ["", "", "PERERA", "FERNANDO", "SILVA", "RAHMAN", "KUMAR", "BANDARA", "HAMEED",
+              "JAYASURIYA", "NAWAZ", "RATNAYAKE"]
+ADDRESSES = ["KKY", "JAFFNA", "COLOMBO", "KANDY", "GALLE", "BATTICALOA", "TRINCOMALEE",
+             "NEGOMBO", "KURUNEGALA", "MATARA"]
+EMAIL_DOMAINS = ["gmail.com", "yahoo.com", "outlook.com"]
+
+
+'''
+Works out the (year, month) pairs the generated history covers.
+It always ends with the month before today.
+'''
+
+def historyMonths(months):
+    today = datetime.date.today()
+    year, month = today.year, today.month
+    result = []
+    for _ in range(months):
+        month -= 1
+        if month == 0:
+            month = 12
+            year -= 1
+        result.append((year, month))
+    result.reverse()
+    return result
+
+
+def monthBounds(year, month):
+    start = datetime.datetime(year, month, 1)
+    if month == 12:
+        end = datetime.datetime(year + 1, 1, 1)
+    else:
+        end = datetime.datetime(year, month + 1, 1)
+    return start, int((end - start).total_seconds())
+
+
+'''
+Builds one random customer profile line and the name that goes with it.
+'''
+
+def makeProfile(rng, accNo):
+    first = rng.choice(FIRST_NAMES)
+    last = rng.choice(LAST_NAMES)
+    name = (first + " " + last).strip()
+
+    birthYear = rng.randint(1950, 2005)
+    dob = f"{birthYear}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    nic = f"{birthYear}{rng.randint(0, 99999999):08d}"
+    phone = "07" + f"{rng.randint(0, 99999999):08d}"
+    email = f"{first.lower()}{accNo}@{rng.choice(EMAIL_DOMAINS)}"
+    address = rng.choice(ADDRESSES)
+    gender = rng.choice(["Male", "Female"])
+    accountType = "Savings" if rng.random() < 0.7 else "Current"
+    status = "Active" if rng.random() < 0.95 else "Inactive"
+
+    return name, [str(accNo), name, nic, dob, phone, email, address, gender, accountType, status]
+
+
+'''
+Writes a full data folder. Returns a small dict describing what was made,
+which the benchmark stores next to its results.
+'''
+
+def generateDataset(outDir, accounts, txnsPerAccount=12, months=12, seed=2025, password="bench"):
+    import bcrypt
+
+    rng = random.Random(seed)
+    os.makedirs(outDir, exist_ok=True)
+
+    def path(fileName):
+        return os.path.join(outDir, fileName)
+
+    names = []
+    savings = bytearray(accounts)
+    active = bytearray(accounts)
+    balances = [0.0] * accounts
+
+    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+    with open(path("CustomerProfiles.txt"), "w") as profiles, \
+            open(path("credentials.txt"), "w") as creds, \
+            open(path("deactivation_log.txt"), "w") as deactivations:
+        creds.write("user:password:role\n")
+        creds.write(f"admin:{hashed}:admin\n")
+        for i in range(accounts):
+            accNo = FIRST_ACCOUNT + i
+            name, parts = makeProfile(rng, accNo)
+            names.append(name)
+            savings[i] = parts[8] == "Savings"
+            active[i] = parts[9] == "Active"
+            profiles.write("|".join(parts) + "\n")
+            creds.write(f"user{accNo}:{hashed}:user\n")
+            if not active[i]:
+                deactivations.write(f"{accNo} | Deactivated on {datetime.datetime.now()} | Reason: generated\n")
+
+    open(path("change_log.txt"), "w").close()
+
+    monthList = historyMonths(months)
+    perMonth = (accounts * txnsPerAccount) // max(len(monthList), 1)
+    transactionCount = 0
+
+    with open(path("transactions.txt"), "w", buffering=1024 * 1024) as txn, \
+            open(path("interestlog.txt"), "w") as interestLog:
+
+        for monthIndex, (year, month) in enumerate(monthList):
+            start, seconds = monthBounds(year, month)
+
+            if monthIndex == 0:
+                # everybody opens their account during the first month
+                openings = sorted((rng.randrange(seconds // 2), i) for i in range(accounts))
+                for offset, i in openings:
+                    amount = float(rng.randrange(1000, 500000, 500))
+                    balances[i] = amount
+                    stamp = (start + datetime.timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S")
+                    txn.write(f"{FIRST_ACCOUNT + i}|Opening Balance|{amount}|{stamp}\n")
+                transactionCount += accounts
+                firstOffset = seconds // 2
+            else:
+                firstOffset = 0
+
+            offsets = sorted(rng.randrange(firstOffset, seconds) for _ in range(perMonth))
+            for offset in offsets:
+                i = rng.randrange(accounts)
+                accNo = FIRST_ACCOUNT + i
+                stamp = (start + datetime.timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S")
+                roll = rng.random()
+
+                if roll < 0.45:
+                    amount = round(rng.uniform(100, 25000), 2)
+                    balances[i] = round(balances[i] + amount, 2)
+                    txn.write(f"{accNo}|Deposit|{amount}|{stamp}\n")
+                    transactionCount += 1
+
+                elif roll < 0.8:
+                    amount = round(min(balances[i], rng.uniform(100, 20000)), 2)
+                    if amount <= 0:
+                        continue
+                    balances[i] = round(balances[i] - amount, 2)
+                    txn.write(f"{accNo}|Withdraw|{amount}|{stamp}\n")
+                    transactionCount += 1
+
+                else:
+                    j = rng.randrange(accounts)
+                    amount = round(min(balances[i], rng.uniform(100, 30000)), 2)
+                    if j == i or amount <= 0:
+                        continue
+                    toAcc = FIRST_ACCOUNT + j
+                    balances[i] = round(balances[i] - amount, 2)
+                    balances[j] = round(balances[j] + amount, 2)
+                    txn.write(f"{accNo}|Transfer to {toAcc}|{amount:.2f}|{stamp}\n")
+                    txn.write(f"{toAcc}|Transfer from {accNo}|{amount:.2f}|{stamp}\n")
+                    transactionCount += 2
+
+            # month end interest for active savings accounts
+            monthEnd = start + datetime.timedelta(seconds=seconds - 1)
+            stamp = monthEnd.strftime("%Y-%m-%d %H:%M:%S")
+            logDate = monthEnd.date()
+            for i in range(accounts):
+                if savings[i] and active[i]:
+                    interest = format(balances[i] * MONTHLY_RATE, ".2f")
+                    balances[i] = float(format(balances[i] + float(interest), ".2f"))
+                    txn.write(f"{FIRST_ACCOUNT + i}|Interest|{interest}|{stamp}\n")
+                    interestLog.write(f"{FIRST_ACCOUNT + i}|{logDate}|{interest}|{MONTHLY_RATE * 100:.2f}%\n")
+                    transactionCount += 1
+
+    with open(path("AccountDetails.txt"), "w") as f:
+        for i in range(accounts):
+            f.write(f"{FIRST_ACCOUNT + i}|{names[i]}|{balances[i]:.2f}\n")
+
+    return {
+        "accounts": accounts,
+        "transactions": transactionCount,
+        "months": len(monthList),
+        "seed": seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic banking data files.")
+    parser.add_argument("--size", choices=sorted(SIZES), help="preset number of accounts")
+    parser.add_argument("--accounts", type=int, help="exact number of accounts (overrides --size)")
+    parser.add_argument("--txns-per-account", type=int, default=12, help="average activity per account")
+    parser.add_argument("--months", type=int, default=12, help="months of history to generate")
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--password", default="bench", help="password shared by every generated login")
+    parser.add_argument("--out", required=True, help="folder to write the data files into")
+    args = parser.parse_args()
+
+    accounts = args.accounts or SIZES.get(args.size)
+    if not accounts:
+        parser.error("give either --size or --accounts")
+
+    info = generateDataset(args.out, accounts, args.txns_per_account, args.months, args.seed, args.password)
+    print(f"Wrote {info['accounts']} accounts and {info['transactions']} transactions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Idempotency Keys
+-------------------------------
+
+A deposit, withdrawal or transfer can be given a reference (the slip
+number, or a key a client makes up). The first time a reference is used
+the money moves and the result is remembered; a repeat of the same
+movement with the same reference (a teller pressing again after a slow
+response, a client retrying) gets the first result back and nothing
+moves a second time.
+
+    idempotency.log     one JSON line per reference used:
+                        {"key": ..., "op": ..., "exp": ..., "result": ...}
+
+- op is what the reference was used for ("DEP|2004|5000", type, accounts
+  and cents), so the same reference for a different movement is refused
+  instead of being taken as a repeat
+- exp is when the reference is forgotten (TTL after it was used)
+
+In memory the references are kept in an OrderedDict, least recently
+used first, so a look-up is one dict access and the oldest reference is
+dropped once there are more than CAPACITY. Other processes' references
+are picked up by reading just the new end of the log (see tailer.py),
+and the log is rewritten with only the live references once it gets
+much longer than that.
+
+lookup and remember have to be called holding the data lock, in the
+same with-block as the movement, so two retries can never both go
+through.
+"""
+
+
+import json
+import time
+from collections import OrderedDict
+
+import datacache
+from metrics import openFile
+from tailer import LogTail
+
+
+KEYS_FILE = "idempotency.log"
+
+# how long a reference is remembered, in seconds
+TTL = 24 * 3600
+CAPACITY = 50000
+COMPACT_AFTER = 2 * CAPACITY
+
+journal = LogTail(KEYS_FILE)
+cache = OrderedDict()            # key -> (op, expires, result)
+state = {"lines": 0}
+
+
+class ReusedReference(ValueError):
+    pass
+
+
+def add(key, op, expires, result):
+    cache[key] = (op, expires, result)
+    cache.move_to_end(key)
+    while len(cache) > CAPACITY:
+        cache.popitem(last=False)
+
+
+def refresh():
+    newLines, reset = journal.poll()
+    if reset:
+        cache.clear()
+        state["lines"] = 0
+    now = time.time()
+    for line in newLines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        state["lines"] += 1
+        if entry["exp"] > now:
+            add(entry["key"], entry["op"], entry["exp"], entry["result"])
+
+
+'''
+True if the reference is in use (for anything) and not expired yet.
+'''
+
+def known(key):
+    if not key:
+        return False
+    refresh()
+    entry = cache.get(key)
+    return entry is not None and entry[1] > time.time()
+
+
+'''
+The result remembered for this reference, or None if it is new (or
+expired). Raises ReusedReference if it was used for a different
+movement.
+'''
+
+def lookup(key, op):
+    if not key:
+        return None
+    refresh()
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    usedFor, expires, result = entry
+    if expires <= time.time():
+        del cache[key]
+        return None
+    if usedFor != op:
+        raise ReusedReference(f"reference {key} was already used for a different transaction")
+    cache.move_to_end(key)
+    return result
+
+
+def remember(key, op, result):
+    if not key:
+        return
+    expires = time.time() + TTL
+    line = json.dumps({"key": key, "op": op, "exp": expires, "result": result}, separators=(",", ":"))
+    with openFile(KEYS_FILE, "a") as f:
+        f.write(line + "\n")
+    # read back through the journal, so the offset stays right
+    refresh()
+    if state["lines"] > COMPACT_AFTER:
+        compact()
+
+
+'''
+Every entry in the log as a dict, oldest first. Used to carry references
+over a restore (see snapshots.py).
+'''
+
+def logEntries():
+    entries = []
+    try:
+        with openFile(KEYS_FILE, "r") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def rememberEntries(entries):
+    if not entries:
+        return
+    with openFile(KEYS_FILE, "a") as f:
+        f.write("".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries))
+    refresh()
+
+
+'''
+Rewrites the log with only the references still remembered, least
+recently used first.
+'''
+
+def compact():
+    now = time.time()
+    lines = [json.dumps({"key": key, "op": op, "exp": expires, "result": result}, separators=(",", ":")) + "\n"
+             for key, (op, expires, result) in cache.items() if expires > now]
+    datacache.writeAtomically(KEYS_FILE, "".join(lines))
+    refresh()
@@ -0,0 +1,505 @@
+"""
+Ledger
+-------------------------------
+
+Keeps transaction history split up by month.
+
+- transactions.txt is the hot segment: it only holds the current month
+  and is the only file new transactions are appended to
+- when a transaction for a new month arrives, every older line in
+  transactions.txt is moved into a closed segment for its month,
+  ledger/transactions-YYYY-MM.txt.gz, and compressed with gzip
+- ledger/index.txt lists each closed segment with the first and last
+  timestamp it holds and how many lines, so a query for recent dates
+  can skip the old segments without opening them
+- a rotation writes the new segments and the new transactions.txt under
+  temporary names, then ledger/rotation.txt (the new index), and only
+  then puts them in place. If the app stops in between, the next
+  process to take the data lock finishes the job from rotation.txt, so
+  a line is never left both in a segment and in transactions.txt
+
+Each transaction is written as one compact JSON line:
+
+    {"id":42,"acc":"2004","type":"XOUT","cp":"2005","amt":100000,"ts":1747000000,"bal":4640001}
+
+- id    running transaction number (the last one used is kept in
+        ledger/sequence.txt)
+- type  OPEN, DEP, WDR, XOUT (transfer out), XIN (transfer in), INT,
+        EMI, or MISC for anything else
+- cp    the other account of a transfer
+- amt   amount in cents, always positive
+- ts    time as seconds since the epoch
+- bal   account balance in cents after this transaction
+
+Old "accNo|Type|amount|timestamp" lines are still read (they just have
+no id or balance), so existing files do not need converting.
+
+Appends also update the daily summaries (see summaries.py).
+"""
+
+
+import datetime
+import gzip
+import json
+import os
+import shutil
+import time
+
+import datacache
+import locking
+import summaries
+from metrics import openFile
+from records import toCents
+
+
+ACTIVE_FILE = "transactions.txt"
+LEDGER_DIR = "ledger"
+INDEX_FILE = os.path.join(LEDGER_DIR, "index.txt")
+SEQUENCE_FILE = os.path.join(LEDGER_DIR, "sequence.txt")
+ROTATION_FILE = os.path.join(LEDGER_DIR, "rotation.txt")
+
+# type code -> how it was written in the old text format
+LABELS = {
+    "OPEN": "Opening Balance",
+    "DEP": "Deposit",
+    "WDR": "Withdraw",
+    "XOUT": "Transfer to",
+    "XIN": "Transfer from",
+    "INT": "Interest",
+    "EMI": "EMI Payment",
+}
+LEGACY_CODES = {label: code for code, label in LABELS.items()}
+
+CREDIT_CODES = frozenset(("OPEN", "DEP", "XIN", "INT"))
+
+# old text types that add money to the account; everything else takes it out
+CREDIT_TYPES = ("Opening Balance", "Deposit", "Interest", "Transfer from")
+
+STAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# "YYYY-MM-DD HH" -> epoch of the start of that hour
+hourEpochs = {}
+
+
+'''
+Old ledger lines carry a local time stamp. mktime is the slow part of
+reading them, so it runs once per hour and the minutes and seconds are
+added on.
+'''
+
+def stampToEpoch(stamp):
+    hour = stamp[:13]
+    base = hourEpochs.get(hour)
+    if base is None:
+        base = int(time.mktime((int(stamp[0:4]), int(stamp[5:7]), int(stamp[8:10]),
+                                int(stamp[11:13]), 0, 0, 0, 0, -1)))
+        hourEpochs[hour] = base
+    return base + int(stamp[14:16]) * 60 + int(stamp[17:19])
+
+
+def epochToStamp(epoch):
+    return time.strftime(STAMP_FORMAT, time.localtime(epoch))
+
+
+'''
+One ledger entry. Amounts and balances are whole cents, the time is
+seconds since the epoch. Old-format lines come back with txnId and
+balanceCents set to None.
+'''
+
+class Transaction:
+    __slots__ = ("txnId", "accNo", "code", "counterparty", "cents", "epoch", "balanceCents", "note")
+
+    def __init__(self, txnId, accNo, code, counterparty, cents, epoch, balanceCents=None, note=None):
+        self.txnId = txnId
+        self.accNo = accNo
+        self.code = code
+        self.counterparty = counterparty
+        self.cents = cents
+        self.epoch = epoch
+        self.balanceCents = balanceCents
+        self.note = note
+
+    @classmethod
+    def create(cls, accNo, code, amount, balance, counterparty=None, epoch=None):
+        if epoch is None:
+            epoch = int(time.time())
+        return cls(None, accNo, code, counterparty, toCents(amount), epoch, toCents(balance))
+
+    @property
+    def amount(self):
+        return self.cents / 100
+
+    @property
+    def balance(self):
+        return None if self.balanceCents is None else self.balanceCents / 100
+
+    @property
+    def signedCents(self):
+        if self.code in CREDIT_CODES:
+            return self.cents
+        if self.code == "MISC" and self.note and self.note.startswith(CREDIT_TYPES):
+            return self.cents
+        return -self.cents
+
+    def stamp(self):
+        return epochToStamp(self.epoch)
+
+    def label(self):
+        if self.code in ("XOUT", "XIN"):
+            return f"{LABELS[self.code]} {self.counterparty}"
+        if self.code == "MISC":
+            return self.note or "Other"
+        return LABELS.get(self.code, self.code)
+
+    def toJson(self):
+        data = {"id": self.txnId, "acc": self.accNo, "type": self.code}
+        if self.counterparty is not None:
+            data["cp"] = self.counterparty
+        data["amt"] = self.cents
+        data["ts"] = self.epoch
+        if self.balanceCents is not None:
+            data["bal"] = self.balanceCents
+        if self.note is not None:
+            data["note"] = self.note
+        return json.dumps(data, separators=(",", ":"))
+
+
+def parseLegacy(line):
+    parts = line.rstrip("\n").split("|")
+    if len(parts) != 4:
+        return None
+    accNo, txnType, amount, stamp = parts
+    try:
+        cents = toCents(amount)
+        epoch = stampToEpoch(stamp)
+    except ValueError:
+        return None
+
+    code = LEGACY_CODES.get(txnType)
+    counterparty = None
+    note = None
+    if code is None:
+        if txnType.startswith("Transfer to "):
+            code, counterparty = "XOUT", txnType[12:]
+        elif txnType.startswith("Transfer from "):
+            code, counterparty = "XIN", txnType[14:]
+        else:
+            code, note = "MISC", txnType
+    return Transaction(None, accNo, code, counterparty, cents, epoch, None, note)
+
+
+'''
+Turns one ledger line, in either format, into a Transaction.
+Returns None for blank or broken lines.
+'''
+
+def parseTransaction(line):
+    if line.startswith("{"):
+        try:
+            data = json.loads(line)
+            return Transaction(data.get("id"), data["acc"], data["type"], data.get("cp"),
+                               data["amt"], data["ts"], data.get("bal"), data.get("note"))
+        except (ValueError, KeyError):
+            return None
+    return parseLegacy(line)
+
+
+def segmentName(month):
+    return f"transactions-{month}.txt.gz"
+
+
+def lineTimestamp(line):
+    record = parseTransaction(line)
+    if record is None:
+        return ""
+    return record.stamp()
+
+
+def currentMonth():
+    return datetime.date.today().strftime("%Y-%m")
+
+
+'''
+Turns "YYYY", "YYYY-MM", "YYYY-MM-DD" or a full timestamp into epoch
+seconds: the first second of that period, or with end=True the first
+second after it.
+'''
+
+def periodEpoch(text, end=False):
+    text = text.strip()
+    if len(text) == 4:
+        start = datetime.datetime(int(text), 1, 1)
+        after = datetime.datetime(int(text) + 1, 1, 1)
+    elif len(text) == 7:
+        start = datetime.datetime.strptime(text, "%Y-%m")
+        after = (start + datetime.timedelta(days=32)).replace(day=1)
+    elif len(text) == 10:
+        start = datetime.datetime.strptime(text, "%Y-%m-%d")
+        after = start + datetime.timedelta(days=1)
+    else:
+        start = datetime.datetime.strptime(text, STAMP_FORMAT)
+        after = start + datetime.timedelta(seconds=1)
+    return int(time.mktime((after if end else start).timetuple()))
+
+
+'''
+Reads ledger/index.txt into a list of
+[segment file name, first timestamp, last timestamp, line count].
+'''
+
+def readIndex(path=INDEX_FILE):
+    segments = []
+    try:
+        with openFile(path, "r") as f:
+            for line in f:
+                parts = line.strip().split("|")
+                if len(parts) == 4:
+                    segments.append([parts[0], parts[1], parts[2], int(parts[3])])
+    except FileNotFoundError:
+        pass
+    return segments
+
+
+def writeIndex(segments, path=INDEX_FILE):
+    tempPath = path + ".tmp"
+    with openFile(tempPath, "w") as f:
+        for name, first, last, count in sorted(segments):
+            f.write(f"{name}|{first}|{last}|{count}\n")
+    os.replace(tempPath, path)
+
+
+'''
+The month of the oldest line in transactions.txt, skipping blank or
+broken lines at the top, or "" if it has none.
+'''
+
+def activeMonth():
+    try:
+        with openFile(ACTIVE_FILE, "r") as f:
+            for line in f:
+                stamp = lineTimestamp(line)
+                if stamp:
+                    return stamp[:7]
+    except FileNotFoundError:
+        pass
+    return ""
+
+
+'''
+Moves every line older than the given month out of transactions.txt
+into its monthly gzip segment and updates the index. Returns how many
+lines were moved.
+'''
+
+def rotateLedger(keepFrom=None):
+    keepFrom = keepFrom or currentMonth()
+    os.makedirs(LEDGER_DIR, exist_ok=True)
+
+    writers = {}
+    ranges = {}
+    moved = 0
+    keptPath = ACTIVE_FILE + ".tmp"
+    # left by a rotation that stopped before rotation.txt was written
+    for name in os.listdir(LEDGER_DIR):
+        if name.endswith(".gz.tmp"):
+            os.remove(os.path.join(LEDGER_DIR, name))
+
+    try:
+        with openFile(ACTIVE_FILE, "r") as source, openFile(keptPath, "w") as kept:
+            for line in source:
+                stamp = lineTimestamp(line)
+                month = stamp[:7]
+                if not stamp or month >= keepFrom:
+                    kept.write(line)
+                    continue
+
+                writer = writers.get(month)
+                if writer is None:
+                    tempPath = os.path.join(LEDGER_DIR, segmentName(month) + ".tmp")
+                    raw = open(tempPath, "wb")
+                    finalPath = os.path.join(LEDGER_DIR, segmentName(month))
+                    if os.path.exists(finalPath):
+                        # gzip files can simply be joined end to end
+                        with open(finalPath, "rb") as existing:
+                            shutil.copyfileobj(existing, raw)
+                    writer = writers[month] = (raw, gzip.GzipFile(fileobj=raw, mode="wb"))
+                    ranges[month] = [stamp, stamp, 0]
+
+                writer[1].write(line.encode())
+                span = ranges[month]
+                span[0] = min(span[0], stamp)
+                span[1] = max(span[1], stamp)
+                span[2] += 1
+                moved += 1
+    except FileNotFoundError:
+        return 0
+    finally:
+        for raw, compressed in writers.values():
+            compressed.close()
+            raw.close()
+
+    if not moved:
+        os.remove(keptPath)
+        return 0
+
+    segments = {entry[0]: entry for entry in readIndex()}
+    for month, (first, last, count) in ranges.items():
+        name = segmentName(month)
+        if name in segments:
+            old = segments[name]
+            segments[name] = [name, min(old[1], first), max(old[2], last), old[3] + count]
+        else:
+            segments[name] = [name, first, last, count]
+
+    # from here on the rotation is finished even if the app stops
+    writeIndex(list(segments.values()), ROTATION_FILE)
+    finishRotation()
+    return moved
+
+
+'''
+Puts the files of a rotation in place: the new segments, the index and
+then transactions.txt. Once transactions.txt has been replaced the rest
+is done already, and only rotation.txt is left to remove.
+'''
+
+def finishRotation():
+    if not os.path.exists(ROTATION_FILE):
+        return 0
+    segments = readIndex(ROTATION_FILE)
+    keptPath = ACTIVE_FILE + ".tmp"
+    if os.path.exists(keptPath):
+        for name, first, last, count in segments:
+            tempPath = os.path.join(LEDGER_DIR, name + ".tmp")
+            if os.path.exists(tempPath):
+                os.replace(tempPath, os.path.join(LEDGER_DIR, name))
+        writeIndex(segments)
+        os.replace(keptPath, ACTIVE_FILE)
+    os.remove(ROTATION_FILE)
+    return len(segments)
+
+
+locking.recoveries.append(finishRotation)
+
+
+'''
+Hands out the next count transaction ids.
+'''
+
+def nextIds(count):
+    os.makedirs(LEDGER_DIR, exist_ok=True)
+    try:
+        with openFile(SEQUENCE_FILE, "r") as f:
+            last = int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        last = 0
+
+    tempPath = SEQUENCE_FILE + ".tmp"
+    with openFile(tempPath, "w") as f:
+        f.write(f"{last + count}\n")
+    os.replace(tempPath, SEQUENCE_FILE)
+    return range(last + 1, last + count + 1)
+
+
+'''
+Adds Transactions to the ledger, giving each one an id. If the hot
+segment still holds an older month, it is rotated out first. The daily
+summaries are updated from the balances the records carry.
+'''
+
+def appendTransactions(records):
+    if not records:
+        return
+
+    month = epochToStamp(records[0].epoch)[:7]
+    hotMonth = activeMonth()
+    if hotMonth and hotMonth < month:
+        rotateLedger(month)
+
+    for record, txnId in zip(records, nextIds(len(records))):
+        record.txnId = txnId
+
+    datacache.appendLines(ACTIVE_FILE, [record.toJson() + "\n" for record in records])
+
+    movements = []
+    for record in records:
+        if record.balanceCents is not None:
+            movements.append((record.accNo, record.stamp()[:10], record.signedCents / 100, record.balance))
+    summaries.recordMovements(movements)
+
+
+'''
+Lists the ledger files that may hold lines between since and until
+(timestamps or dates as text, either may be None), oldest first.
+'''
+
+def segmentsFor(since=None, until=None):
+    paths = []
+    for name, first, last, count in sorted(readIndex()):
+        if since and last < since:
+            continue
+        if until and first[:len(until)] > until:
+            continue
+        paths.append(os.path.join(LEDGER_DIR, name))
+    paths.append(ACTIVE_FILE)
+    return paths
+
+
+def openSegment(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt")
+    return openFile(path, "r")
+
+
+'''
+The lines of one segment. The hot segment comes from the data cache
+(see datacache.py), closed segments are read from disk.
+'''
+
+def segmentLines(path):
+    if path == ACTIVE_FILE:
+        yield from datacache.lines(path)
+        return
+    with openSegment(path) as f:
+        yield from f
+
+
+'''
+Yields every Transaction between since and until (both inclusive, as
+"YYYY-MM", "YYYY-MM-DD" or a full timestamp, either may be None),
+oldest segment first. accNo, when given, skips other accounts' lines
+before they are parsed.
+'''
+
+def readTransactions(since=None, until=None, accNo=None):
+    sinceEpoch = periodEpoch(since) if since else None
+    untilEpoch = periodEpoch(until, end=True) if until else None
+    legacyPrefix = accNo + "|" if accNo else None
+    jsonMarker = f'"acc":"{accNo}"' if accNo else None
+
+    for path in segmentsFor(since, until):
+        try:
+            for line in segmentLines(path):
+                if accNo and not (line.startswith(legacyPrefix) or jsonMarker in line):
+                    continue
+                record = parseTransaction(line)
+                if record is None:
+                    continue
+                if sinceEpoch is not None and record.epoch < sinceEpoch:
+                    continue
+                if untilEpoch is not None and record.epoch >= untilEpoch:
+                    continue
+                yield record
+        except FileNotFoundError:
+            continue
+
+
+'''
+Every ledger entry as (accNo, "YYYY-MM-DD", signed amount), oldest first.
+Used to rebuild the daily summaries.
+'''
+
+def ledgerMovements():
+    for record in readTransactions():
+        yield record.accNo, record.stamp()[:10], record.signedCents / 100
@@ -0,0 +1,99 @@
+"""
+Data Lock
+-------------------------------
+
+One lock for the whole data folder, kept on bank.lock with flock:
+
+- changes (a deposit, a transfer, a profile edit ...) hold it exclusively
+  while they write, so nothing sees half of a change
+- snapshots hold it shared, so they can run alongside each other but
+  never in the middle of a change
+
+The lock can be taken again while already held (a transfer inside a
+batch job, say); only the outermost with-block really locks and unlocks.
+A shared hold is never turned into an exclusive one: flock lets go of
+the shared lock before taking the exclusive one, so another writer could
+get in between and what was read under the shared hold would be stale.
+Asking for the exclusive lock inside a shared hold raises LockUpgrade;
+code that may write has to take it exclusively from the start.
+On systems without fcntl (Windows) it does nothing.
+
+How long the lock was waited for and held is recorded as the
+lock_wait and lock_hold metrics (see metrics.py).
+
+Functions in recoveries are run each time the lock is taken exclusively,
+before anything else, to finish a change an earlier process was stopped
+in the middle of (see shards.py).
+
+A read-only replica (see replication.py) sets readOnly, and from then on
+asking for the exclusive lock raises PermissionError instead of
+letting a change through.
+"""
+
+
+import contextlib
+import time
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+LOCK_FILE = "bank.lock"
+
+state = {"file": None, "depth": 0, "shared": False, "waited": 0.0, "held": 0.0}
+recoveries = []
+readOnly = False
+
+
+class LockUpgrade(RuntimeError):
+    pass
+
+
+'''
+with dataLock(): ...              exclusive, for writers
+with dataLock(shared=True): ...   shared, for consistent reads
+'''
+
+@contextlib.contextmanager
+def dataLock(shared=False):
+    if readOnly and not shared:
+        raise PermissionError("this is a read-only replica, changes have to be made on the primary")
+    if fcntl is None:
+        yield
+        return
+
+    if state["depth"]:
+        # already held: an exclusive hold covers everything, a shared one
+        # only other reads
+        if state["shared"] and not shared:
+            raise LockUpgrade("the data lock is held shared; take it exclusively from the start to write")
+        state["depth"] += 1
+        try:
+            yield
+        finally:
+            state["depth"] -= 1
+        return
+
+    f = open(LOCK_FILE, "a")
+    start = time.perf_counter()
+    fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+    acquired = time.perf_counter()
+    state.update(file=f, depth=1, shared=shared, waited=acquired - start)
+    try:
+        if not shared:
+            for recover in recoveries:
+                recover()
+        yield
+    finally:
+        state["depth"] = 0
+        state["file"] = None
+        fcntl.flock(f, fcntl.LOCK_UN)
+        state["held"] = time.perf_counter() - acquired
+        f.close()
+        if metrics.enabled:
+            metrics.record("lock_wait", state["waited"])
+            metrics.record("lock_hold", state["held"])
@@ -0,0 +1,288 @@
+"""
+Metrics
+-------------------------------
+
+Lightweight counters and timing histograms for the banking app.
+
+- every banking operation: how many times it ran, how long it took
+  (wall clock and CPU), as a histogram
+- every data file open: how many times, how many bytes were read or
+  written, and how long the file was held open
+
+Metrics are off unless the BANK_METRICS environment variable is set
+(or enable() is called). When they are off the wrappers only check one
+flag and call straight through, so normal runs do not pay for them.
+
+The numbers can be written out in the Prometheus text format
+(writePrometheus) or shown from the admin menu. Setting
+BANK_METRICS_FILE writes the file automatically when the app exits.
+"""
+
+
+import atexit
+import bisect
+import functools
+import os
+import time
+
+
+enabled = os.environ.get("BANK_METRICS", "") not in ("", "0")
+
+# histogram bucket upper bounds, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+'''
+A fixed-bucket latency histogram, the same shape Prometheus uses.
+'''
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        # returns the upper bound of the bucket the quantile falls in
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for index, bucketCount in enumerate(self.counts):
+            running += bucketCount
+            if running >= target:
+                return BUCKETS[index] if index < len(BUCKETS) else float("inf")
+        return float("inf")
+
+
+class OperationStats:
+    __slots__ = ("latency", "cpu")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.cpu = 0.0
+
+
+class FileStats:
+    __slots__ = ("opens", "bytes", "held")
+
+    def __init__(self):
+        self.opens = 0
+        self.bytes = 0
+        self.held = Histogram()
+
+
+operations = {}
+files = {}
+
+
+def reset():
+    operations.clear()
+    files.clear()
+
+
+def record(name, seconds, cpuSeconds=0.0):
+    stats = operations.get(name)
+    if stats is None:
+        stats = operations[name] = OperationStats()
+    stats.latency.observe(seconds)
+    stats.cpu += cpuSeconds
+
+
+'''
+Decorator for banking operations. Wall time includes any time spent
+waiting at a prompt, so CPU time is kept as well to show the real work.
+'''
+
+def timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            startCpu = time.process_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start, time.process_time() - startCpu)
+        return wrapper
+    return decorator
+
+
+def fileMode(mode):
+    if "a" in mode:
+        return "append"
+    if "w" in mode or "+" in mode:
+        return "write"
+    return "read"
+
+
+def filePosition(f):
+    try:
+        return os.lseek(f.fileno(), 0, os.SEEK_CUR)
+    except (OSError, ValueError):
+        return 0
+
+
+'''
+Wraps an open file so the bytes moved and the time it was held open
+get recorded when the with-block ends.
+'''
+
+class MeteredFile:
+
+    def __init__(self, path, mode, f):
+        self.key = (os.path.basename(path), fileMode(mode))
+        self.file = f
+        self.startPosition = filePosition(f)
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        return self.file
+
+    def __exit__(self, excType, exc, tb):
+        try:
+            if self.key[1] != "read":
+                self.file.flush()
+            moved = abs(filePosition(self.file) - self.startPosition)
+        finally:
+            self.file.close()
+
+        stats = files.get(self.key)
+        if stats is None:
+            stats = files[self.key] = FileStats()
+        stats.opens += 1
+        stats.bytes += moved
+        stats.held.observe(time.perf_counter() - self.start)
+        return False
+
+
+'''
+Use this instead of open() for data files, always in a with-block.
+'''
+
+def openFile(path, mode="r", *args, **kwargs):
+    f = open(path, mode, *args, **kwargs)
+    if not enabled:
+        return f
+    return MeteredFile(path, mode, f)
+
+
+def formatLabels(labels):
+    return ",".join(f'{key}="{value}"' for key, value in labels)
+
+
+def histogramLines(name, labels, histogram):
+    lines = []
+    running = 0
+    for index, bound in enumerate(BUCKETS):
+        running += histogram.counts[index]
+        lines.append(f'{name}_bucket{{{formatLabels(labels + [("le", repr(bound))])}}} {running}')
+    lines.append(f'{name}_bucket{{{formatLabels(labels + [("le", "+Inf")])}}} {histogram.count}')
+    lines.append(f"{name}_sum{{{formatLabels(labels)}}} {histogram.total:.6f}")
+    lines.append(f"{name}_count{{{formatLabels(labels)}}} {histogram.count}")
+    return lines
+
+
+'''
+Renders everything recorded so far in the Prometheus text format.
+'''
+
+def prometheusText():
+    lines = [
+        "# HELP bank_operation_seconds Wall time of banking operations.",
+        "# TYPE bank_operation_seconds histogram",
+    ]
+    for name in sorted(operations):
+        lines.extend(histogramLines("bank_operation_seconds", [("operation", name)], operations[name].latency))
+
+    lines.append("# HELP bank_operation_cpu_seconds_total CPU time spent in banking operations.")
+    lines.append("# TYPE bank_operation_cpu_seconds_total counter")
+    for name in sorted(operations):
+        lines.append(f'bank_operation_cpu_seconds_total{{operation="{name}"}} {operations[name].cpu:.6f}')
+
+    lines.append("# HELP bank_file_opens_total Data file opens.")
+    lines.append("# TYPE bank_file_opens_total counter")
+    for (fileName, mode) in sorted(files):
+        lines.append(f'bank_file_opens_total{{file="{fileName}",mode="{mode}"}} {files[(fileName, mode)].opens}')
+
+    lines.append("# HELP bank_file_bytes_total Bytes read from or written to data files.")
+    lines.append("# TYPE bank_file_bytes_total counter")
+    for (fileName, mode) in sorted(files):
+        lines.append(f'bank_file_bytes_total{{file="{fileName}",mode="{mode}"}} {files[(fileName, mode)].bytes}')
+
+    lines.append("# HELP bank_file_open_seconds Time data files were held open.")
+    lines.append("# TYPE bank_file_open_seconds histogram")
+    for (fileName, mode) in sorted(files):
+        labels = [("file", fileName), ("mode", mode)]
+        lines.extend(histogramLines("bank_file_open_seconds", labels, files[(fileName, mode)].held))
+
+    return "\n".join(lines) + "\n"
+
+
+def writePrometheus(path):
+    tempPath = path + ".tmp"
+    with open(tempPath, "w") as f:
+        f.write(prometheusText())
+    os.replace(tempPath, path)
+
+
+'''
+Rows for the admin menu tables: one list for operations, one for files.
+'''
+
+def summaryRows():
+    operationRows = []
+    for name in sorted(operations, key=lambda n: operations[n].latency.total, reverse=True):
+        stats = operations[name]
+        count = stats.latency.count
+        operationRows.append([
+            name,
+            count,
+            f"{stats.latency.total / count * 1000:.2f}" if count else "0",
+            f"<= {stats.latency.quantile(0.99) * 1000:g}",
+            f"{stats.cpu * 1000:.1f}",
+        ])
+
+    fileRows = []
+    for key in sorted(files, key=lambda k: files[k].bytes, reverse=True):
+        stats = files[key]
+        fileRows.append([
+            key[0],
+            key[1],
+            stats.opens,
+            stats.bytes,
+            f"{stats.held.total * 1000:.1f}",
+        ])
+    return operationRows, fileRows
+
+
+def writeOnExit():
+    path = os.environ.get("BANK_METRICS_FILE")
+    if enabled and path:
+        try:
+            writePrometheus(path)
+        except OSError:
+            pass
+
+
+atexit.register(writeOnExit)
@@ -0,0 +1,147 @@
+"""
+Batch Profile Changes
+-------------------------------
+
+Applies a whole file of profile changes in one go, instead of one
+updateCustomer or softDeleteCustomer session per account. One line per
+change:
+
+    accNo|field|new value
+    accNo|Status|Inactive|reason
+    accNo|Status|Active
+
+field is one of Phone, Email, Address, Name, NIC, DOB, Gender or Status.
+Blank lines and lines starting with # are skipped.
+
+- every value gets the same checks as at the prompts (see validation.py)
+- the changes are applied in file order to the profiles in memory, and
+  CustomerProfiles.txt is written once at the end, under the data lock
+- all change_log.txt and deactivation_log.txt entries go out as one
+  append per log
+
+Lines that cannot be applied are skipped and reported; the rest still go
+through.
+"""
+
+
+import time
+
+import auditlog
+import searchindex
+import shards
+from locking import dataLock
+from metrics import openFile
+from validation import checkValue
+
+
+PROFILES = "CustomerProfiles.txt"
+
+# field name: (records.Profile attribute, validation type)
+FIELDS = {
+    "phone": ("phone", "phone"),
+    "email": ("email", "email"),
+    "address": ("address", None),
+    "name": ("name", None),
+    "nic": ("nic", "nic"),
+    "dob": ("dob", "dob"),
+    "gender": ("gender", "gender"),
+}
+
+FIELD_NAMES = {"phone": "Phone", "email": "Email", "address": "Address", "name": "Name",
+               "nic": "NIC", "dob": "DOB", "gender": "Gender", "status": "Status"}
+
+
+'''
+Reads the change file into a list of (line number, accNo, field, value,
+reason), plus a list of (line number, problem) for lines that are
+broken.
+'''
+
+def readChanges(path):
+    changes = []
+    problems = []
+    with openFile(path, "r") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split("|")
+            if len(parts) < 3:
+                problems.append((number, "expected accNo|field|value"))
+                continue
+            field = parts[1].strip().lower()
+            if field not in FIELD_NAMES:
+                problems.append((number, f"unknown field {parts[1]}"))
+                continue
+            reason = "|".join(parts[3:]).strip() if len(parts) > 3 else ""
+            changes.append((number, parts[0].strip(), field, parts[2], reason))
+    return changes, problems
+
+
+def applyBatch(path):
+    start = time.perf_counter()
+    changes, problems = readChanges(path)
+
+    # values are checked before taking the lock
+    checked = []
+    for number, accNo, field, value, reason in changes:
+        if field == "status":
+            value = value.strip().capitalize()
+            if value not in ("Active", "Inactive"):
+                problems.append((number, "status must be Active or Inactive"))
+                continue
+        else:
+            value, problem = checkValue(value, FIELD_NAMES[field], FIELDS[field][1])
+            if problem:
+                problems.append((number, problem))
+                continue
+            if field == "name":
+                value = value.upper()
+        checked.append((number, accNo, field, value, reason))
+
+    changeEntries = []
+    statusEntries = []
+    with dataLock():
+        originals = {}
+        updated = {}
+        for number, accNo, field, value, reason in checked:
+            row = updated.get(accNo)
+            if row is None:
+                row = shards.lookup(PROFILES, accNo)
+                if row is None:
+                    problems.append((number, f"account {accNo} not found"))
+                    continue
+                originals[accNo] = row
+
+            if field == "status":
+                if row.status == value:
+                    problems.append((number, f"account {accNo} is already {value}"))
+                    continue
+                row = row.replace(status=value)
+                if value == "Inactive":
+                    statusEntries.append({"acc": accNo, "event": "deactivate", "reason": reason})
+                else:
+                    statusEntries.append({"acc": accNo, "event": "restore"})
+            else:
+                if row.inactive:
+                    problems.append((number, f"account {accNo} is inactive"))
+                    continue
+                attribute = FIELDS[field][0]
+                changeEntries.append({"acc": accNo, "event": "change", "field": FIELD_NAMES[field],
+                                      "old": getattr(row, attribute), "new": value})
+                row = row.replace(**{attribute: value})
+            updated[accNo] = row
+
+        if updated:
+            shards.updateRows(PROFILES, updated)
+            searchindex.recordProfiles([(originals[accNo], row) for accNo, row in updated.items()])
+            auditlog.record("change", changeEntries)
+            auditlog.record("deactivation", statusEntries)
+
+    problems.sort()
+    return {
+        "applied": len(changeEntries) + len(statusEntries),
+        "accounts": len(updated),
+        "problems": problems,
+        "seconds": time.perf_counter() - start,
+    }
@@ -0,0 +1,117 @@
+"""
+Profiling
+-------------------------------
+
+Runs the banking app (or one of its batch jobs) under cProfile and, when
+it finishes, writes:
+
+- <file>       the raw profile, for snakeviz / pstats
+- <file>.txt   a short report: where the time went for the parts we care
+               about most, then the top N functions by own time and by
+               cumulative time
+
+Used through:  python banking_app.py --profile [FILE] [--profile-top N]
+"""
+
+
+import cProfile
+import io
+import pstats
+import time
+
+
+'''
+Groups of functions we always want to see in the report. Each group
+adds up the time of every profiled function its test matches.
+'''
+
+def isFunction(*names):
+    def test(key, value):
+        return key[2] in names and not key[0].startswith("~")
+    return test
+
+
+def isTabulate(key, value):
+    return key[2] == "tabulate" and "tabulate" in key[0]
+
+
+PARSING_BUILTINS = ("split", "strip", "startswith", "readlines", "readline", "read", "write",
+                    "writelines", "decode")
+
+
+def isParsing(key, value):
+    fileName, _, funcName = key
+    if funcName in ("_strptime", "_strptime_datetime"):
+        return True
+    if fileName != "~":
+        return False
+    return any(f"'{name}'" in funcName or funcName.endswith("." + name) for name in PARSING_BUILTINS)
+
+
+HOTSPOTS = [
+    ("applyMonthlyInterest", isFunction("applyMonthlyInterest"), "cumulative"),
+    ("bcrypt (check_password / hash_password)", isFunction("check_password", "hash_password"), "cumulative"),
+    ("tabulate rendering", isTabulate, "cumulative"),
+    ("file I/O and parsing", isParsing, "own"),
+]
+
+
+def hotspotRows(stats):
+    rows = []
+    for label, test, kind in HOTSPOTS:
+        calls = 0
+        seconds = 0.0
+        for key, value in stats.stats.items():
+            if test(key, value):
+                primitiveCalls, totalCalls, ownTime, cumulativeTime, _ = value
+                calls += totalCalls
+                seconds += cumulativeTime if kind == "cumulative" else ownTime
+        rows.append((label, calls, seconds))
+    return rows
+
+
+'''
+Builds the text report from a finished profile.
+'''
+
+def buildReport(profile, wallSeconds, top):
+    stats = pstats.Stats(profile)
+    lines = [f"Wall time: {wallSeconds:.3f} s", ""]
+
+    lines.append("Hot spots")
+    lines.append("---------")
+    for label, calls, seconds in hotspotRows(stats):
+        share = (seconds / wallSeconds * 100) if wallSeconds else 0.0
+        lines.append(f"{label:<42} {seconds:>10.4f} s  {share:>5.1f}%  {calls:>10} calls")
+    lines.append("")
+
+    for sortKey, title in (("tottime", "Top functions by own time"), ("cumulative", "Top functions by cumulative time")):
+        buffer = io.StringIO()
+        pstats.Stats(profile, stream=buffer).sort_stats(sortKey).print_stats(top)
+        lines.append(title)
+        lines.append("-" * len(title))
+        lines.append(buffer.getvalue().strip())
+        lines.append("")
+
+    return "\n".join(lines)
+
+
+'''
+Runs target() under cProfile. The profile and report are written even
+if the run ends with an error or Ctrl+C.
+'''
+
+def runProfiled(target, profileFile, top=20):
+    profile = cProfile.Profile()
+    start = time.perf_counter()
+    profile.enable()
+    try:
+        return target()
+    finally:
+        profile.disable()
+        wallSeconds = time.perf_counter() - start
+        profile.dump_stats(profileFile)
+        report = buildReport(profile, wallSeconds, top)
+        with open(profileFile + ".txt", "w") as f:
+            f.write(report + "\n")
+        print(f"\nProfile written to {profileFile} (report: {profileFile}.txt)")
@@ -0,0 +1,151 @@
+"""
+Reconciliation
+-------------------------------
+
+Checks that every balance in AccountDetails.txt matches what the ledger
+says it should be (the sum of all its credits minus all its debits).
+
+- the ledger is read once, segment by segment, adding up a net amount
+  per account in whole cents (so rounding never causes false alarms);
+  both the JSON lines and the old text lines are understood
+- with workers > 1 the segments are added up in parallel processes and
+  the per-segment totals merged at the end
+- every account whose stored balance differs from the ledger, or that
+  only shows up on one side, is written to the discrepancy report
+- the ledger and the balances are read under a shared data lock, so a
+  transfer cannot land between the two reads and show up as a false
+  discrepancy
+"""
+
+
+import datetime
+import json
+import time
+
+import ledger
+import shards
+from locking import dataLock
+from metrics import openFile
+
+
+REPORT_FILE = "reconciliation_report.txt"
+
+
+'''
+Adds up one ledger segment: {accNo: [net cents, transaction count]}.
+Runs inside a worker process when reconciling in parallel.
+'''
+
+def aggregateSegment(path):
+    totals = {}
+    creditTypes = ledger.CREDIT_TYPES
+    creditCodes = ledger.CREDIT_CODES
+    loads = json.loads
+    try:
+        with ledger.openSegment(path) as f:
+            for line in f:
+                if line.startswith("{"):
+                    try:
+                        data = loads(line)
+                        accNo = data["acc"]
+                        cents = data["amt"]
+                        credit = data["type"] in creditCodes or data.get("note", "").startswith(creditTypes)
+                    except (ValueError, KeyError):
+                        continue
+                else:
+                    # old text lines: no need to parse the timestamp here
+                    try:
+                        accNo, txnType, amount, _ = line.split("|")
+                        cents = int(round(float(amount) * 100))
+                    except ValueError:
+                        continue
+                    credit = txnType.startswith(creditTypes)
+
+                if not credit:
+                    cents = -cents
+                entry = totals.get(accNo)
+                if entry is None:
+                    totals[accNo] = [cents, 1]
+                else:
+                    entry[0] += cents
+                    entry[1] += 1
+    except FileNotFoundError:
+        pass
+    return totals
+
+
+def aggregateLedger(workers=1):
+    paths = ledger.segmentsFor()
+    if workers > 1 and len(paths) > 1:
+        from multiprocessing import Pool
+        with Pool(min(workers, len(paths))) as pool:
+            parts = pool.map(aggregateSegment, paths)
+    else:
+        parts = [aggregateSegment(path) for path in paths]
+
+    merged = {}
+    for totals in parts:
+        for accNo, (cents, count) in totals.items():
+            entry = merged.get(accNo)
+            if entry is None:
+                merged[accNo] = [cents, count]
+            else:
+                entry[0] += cents
+                entry[1] += count
+    return merged
+
+
+def readBalances():
+    balances = {}
+    for path in shards.paths("AccountDetails.txt"):
+        with openFile(path, "r") as f:
+            for line in f:
+                parts = line.strip().split("|")
+                if len(parts) == 3:
+                    try:
+                        balances[parts[0]] = ledger.toCents(parts[2])
+                    except ValueError:
+                        continue
+    return balances
+
+
+'''
+Runs the whole check and writes the report. Returns a small dict with
+the totals so callers can print a summary.
+'''
+
+def reconcile(workers=1, reportFile=REPORT_FILE):
+    start = time.perf_counter()
+    with dataLock(shared=True):
+        ledgerTotals = aggregateLedger(workers)
+        balances = readBalances()
+
+    discrepancies = []
+    for accNo in sorted(set(ledgerTotals) | set(balances), key=lambda a: (len(a), a)):
+        stored = balances.get(accNo)
+        entry = ledgerTotals.get(accNo)
+        fromLedger = entry[0] if entry else None
+        if stored is None or fromLedger is None or stored != fromLedger:
+            discrepancies.append((accNo, stored, fromLedger, entry[1] if entry else 0))
+
+    def money(cents):
+        return "-" if cents is None else f"{cents / 100:.2f}"
+
+    with openFile(reportFile, "w") as f:
+        f.write(f"# Reconciliation run {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write("# accNo|balance in AccountDetails.txt|balance from ledger|difference|transactions\n")
+        for accNo, stored, fromLedger, count in discrepancies:
+            if stored is not None and fromLedger is not None:
+                difference = money(stored - fromLedger)
+            else:
+                difference = "missing"
+            f.write(f"{accNo}|{money(stored)}|{money(fromLedger)}|{difference}|{count}\n")
+
+    return {
+        "accounts": len(balances),
+        "ledger_accounts": len(ledgerTotals),
+        "transactions": sum(entry[1] for entry in ledgerTotals.values()),
+        "discrepancies": len(discrepancies),
+        "seconds": time.perf_counter() - start,
+        "report": reportFile,
+    }
@@ -0,0 +1,147 @@
+"""
+Account and Profile Records
+-------------------------------
+
+The rows of AccountDetails.txt and CustomerProfiles.txt, as small typed
+objects instead of lists of strings (ledger.Transaction does the same
+for the ledger):
+
+- the fields are named (profile.status instead of parts[9])
+- __slots__ means no per-object dict, just the fields
+- the balance is parsed once, into whole cents
+- values many customers share (gender, account type, status, date of
+  birth, address, names) are interned, so a million "Savings" are one
+  string
+
+datacache.py hands these out for the two files. Like the rows before
+them they belong to the cache, so never change one in place: make a new
+one (withBalance, replace) and pass it to datacache.updateRows.
+
+Resident memory of the cached files, with their account number index,
+for 1M generated accounts (Python 3.11, measured from VmRSS):
+
+    AccountDetails.txt      407 MB as lists  ->  221 MB as records
+    CustomerProfiles.txt    881 MB as lists  ->  467 MB as records
+    credentials.txt         452 MB (still lists)
+
+So a fully cached 1M-account bank takes about 1.15 GB (it was 1.75 GB),
+and BANK_CACHE_MB has to be at least 1200 to keep it all cached. The
+target is to stay under 250 bytes per account and 500 bytes per profile
+as the fields grow.
+"""
+
+
+import sys
+from operator import attrgetter
+
+
+def toCents(amount):
+    return int(round(float(amount) * 100))
+
+
+class Account:
+    __slots__ = ("accNo", "name", "balanceCents")
+
+    def __init__(self, accNo, name, balanceCents):
+        self.accNo = accNo
+        self.name = name
+        self.balanceCents = balanceCents
+
+    @classmethod
+    def create(cls, accNo, name, balance):
+        return cls(accNo, sys.intern(name), toCents(balance))
+
+    '''
+    One line of AccountDetails.txt split on "|", or None if the line is
+    not a valid account.
+    '''
+
+    @classmethod
+    def fromParts(cls, parts):
+        if len(parts) != 3:
+            return None
+        try:
+            cents = toCents(parts[2])
+        except ValueError:
+            return None
+        return cls(parts[0], sys.intern(parts[1]), cents)
+
+    @property
+    def balance(self):
+        return self.balanceCents / 100
+
+    def withBalance(self, balance):
+        return Account(self.accNo, self.name, toCents(balance))
+
+    def toParts(self):
+        return [self.accNo, self.name, f"{self.balanceCents / 100:.2f}"]
+
+    '''
+    The text of AccountDetails.txt for a list of accounts. One loop
+    over the accounts is a lot faster than a toParts() call per account
+    when the whole file is written.
+    '''
+
+    @staticmethod
+    def formatLines(accounts):
+        return "".join([f"{account.accNo}|{account.name}|{account.balanceCents / 100:.2f}\n"
+                        for account in accounts])
+
+    def __eq__(self, other):
+        return isinstance(other, Account) and self.toParts() == other.toParts()
+
+    __hash__ = None
+
+
+PROFILE_FIELDS = ("accNo", "name", "nic", "dob", "phone", "email", "address", "gender", "accountType", "status")
+profileFields = attrgetter(*PROFILE_FIELDS)
+
+
+class Profile:
+    __slots__ = PROFILE_FIELDS
+
+    def __init__(self, accNo, name, nic, dob, phone, email, address, gender, accountType, status):
+        self.accNo = accNo
+        self.name = name
+        self.nic = nic
+        self.dob = dob
+        self.phone = phone
+        self.email = email
+        self.address = address
+        self.gender = gender
+        self.accountType = accountType
+        self.status = status
+
+    @classmethod
+    def fromParts(cls, parts):
+        if len(parts) != 10:
+            return None
+        accNo, name, nic, dob, phone, email, address, gender, accountType, status = parts
+        intern = sys.intern
+        return cls(accNo, intern(name), nic, intern(dob), phone, email, intern(address),
+                   intern(gender), intern(accountType), intern(status))
+
+    @property
+    def inactive(self):
+        return self.status == "Inactive"
+
+    '''
+    A copy with some fields changed: profile.replace(phone="0771234567").
+    '''
+
+    def replace(self, **changes):
+        values = dict(zip(PROFILE_FIELDS, profileFields(self)))
+        values.update(changes)
+        return Profile(**values)
+
+    def toParts(self):
+        return list(profileFields(self))
+
+    @staticmethod
+    def formatLines(profiles):
+        return "".join(["|".join(profileFields(profile)) + "\n" for profile in profiles])
+
+    def __eq__(self, other):
+        return isinstance(other, Profile) and self.toParts() == other.toParts()
+
+    __hash__ = None
@@ -0,0 +1,337 @@
+"""
+Read Replica
+-------------------------------
+
+Keeps a second copy of the data folder up to date, so reports,
+statements and look-ups can be served from there without getting in the
+way of the counters on the primary.
+
+On the primary, "python banking_app.py --job ship --to DIR" looks at
+every data file (the same list a snapshot copies) and sends what changed
+since the last time as one numbered batch:
+
+    append    the new end of a file that only grew (the ledger, the logs,
+              the daily summaries), sent as just the new bytes
+    replace   the whole file, for one that was rewritten (AccountDetails,
+              the profiles, the ledger index ...)
+    remove    a file that is gone
+
+Batches are sent even when nothing changed, so the replica can always
+tell how far behind it is. What was sent so far is kept in
+replication/shipped.json on the primary. A batch is written to
+replication/outgoing.batch and counted in shipped.json before it is
+sent; if the primary stops in between, the next ship sends that same
+batch again before making a new one, so a batch number never stands for
+two different sets of changes. shipped.json also names the "stream" the
+batches belong to: removing it to ship a fresh copy starts a new stream
+at batch 1, which the replica takes from the start.
+
+The transport here (LocalTransport) drops each batch as one file in
+DIR/inbox. DIR can be a folder on another machine (a mount, or synced
+with rsync); anything that gets the batch files there in one piece will
+do.
+
+In the replica folder, "python banking_app.py --job apply" applies the
+batches in order under the replica's own data lock and notes in
+replication/applied.json the last batch, when the primary sent it and
+when it was applied. A batch it has applied already is skipped, and
+refused if it is not the same batch. Profile changes are also written to the search
+index journal, so name and address search stay quick on the replica.
+
+"python banking_app.py --read-only" runs the menu on the replica: it
+refuses anything that writes, shows how old the data is, and refuses to
+answer at all once the replica is more than --max-lag seconds behind.
+The lag is measured with the primary's clock, so the two machines should
+keep the same time.
+"""
+
+
+import hashlib
+import json
+import os
+import time
+
+import datacache
+import locking
+import searchindex
+import snapshots
+from locking import dataLock
+from metrics import openFile
+
+
+STATE_DIR = "replication"
+SHIPPED_FILE = os.path.join(STATE_DIR, "shipped.json")
+OUTGOING_FILE = os.path.join(STATE_DIR, "outgoing.batch")
+APPLIED_FILE = os.path.join(STATE_DIR, "applied.json")
+INBOX = "inbox"
+
+# bytes from the end of a file kept to tell an append from a rewrite
+MARK_SIZE = 64
+MAX_LAG = 300
+
+limits = {"maxLag": MAX_LAG}
+
+
+class ReplicationError(Exception):
+    pass
+
+
+def loadJson(path, default):
+    try:
+        with openFile(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return default
+
+
+def saveJson(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    datacache.writeAtomically(path, json.dumps(value))
+
+
+'''
+Hands batches from the primary to the replica through a folder. Each
+batch is written under a temporary name and renamed, so the applier
+never sees half of one.
+'''
+
+class LocalTransport:
+
+    def __init__(self, replicaDir):
+        self.inbox = os.path.join(replicaDir, INBOX)
+
+    def send(self, seq, header, payload):
+        os.makedirs(self.inbox, exist_ok=True)
+        writeBatch(os.path.join(self.inbox, f"{seq:010d}.batch"), header, payload)
+
+    def pending(self):
+        try:
+            names = sorted(name for name in os.listdir(self.inbox) if name.endswith(".batch"))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.inbox, name) for name in names]
+
+
+def writeBatch(path, header, payload):
+    with open(path + ".tmp", "wb") as f:
+        f.write(json.dumps(header).encode() + b"\n")
+        f.write(payload)
+    os.replace(path + ".tmp", path)
+
+
+def readBatch(path):
+    with open(path, "rb") as f:
+        header = json.loads(f.readline())
+        payload = f.read()
+    return header, payload
+
+
+def batchDigest(header, payload):
+    return hashlib.sha256(json.dumps(header, sort_keys=True).encode() + payload).hexdigest()
+
+
+def fileMark(f, size):
+    f.seek(max(size - MARK_SIZE, 0))
+    return f.read(size - f.tell()).hex()
+
+
+'''
+Sends one batch with everything that changed since the last one.
+Returns the batch number, what is in it and how long it took.
+'''
+
+def ship(transport):
+    start = time.perf_counter()
+    shipped = loadJson(SHIPPED_FILE, {"seq": 0, "files": {}})
+    if "stream" not in shipped:
+        shipped["stream"] = os.urandom(8).hex()
+    sendLeftover(transport, shipped)
+    known = shipped["files"]
+    ops = []
+    chunks = []
+    offset = 0
+
+    with dataLock(shared=True):
+        present = snapshots.dataFiles()
+        for path in present:
+            info = os.stat(path)
+            old = known.get(path)
+            if old and old[:3] == [info.st_ino, info.st_size, info.st_mtime_ns]:
+                continue
+            with open(path, "rb") as f:
+                if (old and old[0] == info.st_ino and info.st_size > old[1]
+                        and fileMark(f, old[1]) == old[3]):
+                    f.seek(old[1])
+                    op = {"op": "append", "path": path, "at": old[1]}
+                else:
+                    f.seek(0)
+                    op = {"op": "replace", "path": path}
+                data = f.read(info.st_size - f.tell())
+                size = f.tell()
+                mark = fileMark(f, size)
+            op.update(start=offset, length=len(data))
+            ops.append(op)
+            chunks.append(data)
+            offset += len(data)
+            known[path] = [info.st_ino, size, info.st_mtime_ns, mark]
+
+        for path in sorted(set(known) - set(present)):
+            ops.append({"op": "remove", "path": path})
+            del known[path]
+        lastTxnId = snapshots.lastTxnId()
+
+    seq = shipped["seq"] + 1
+    header = {"stream": shipped["stream"], "seq": seq, "sent": time.time(),
+              "last_txn_id": lastTxnId, "ops": ops}
+    payload = b"".join(chunks)
+    # kept and counted before it goes, so a crash while sending leaves
+    # this very batch to send again rather than a new one under its number
+    os.makedirs(STATE_DIR, exist_ok=True)
+    writeBatch(OUTGOING_FILE, header, payload)
+    shipped["seq"] = seq
+    saveJson(SHIPPED_FILE, shipped)
+    transport.send(seq, header, payload)
+    os.remove(OUTGOING_FILE)
+    return {"seq": seq, "files": len(ops), "bytes": offset, "seconds": time.perf_counter() - start}
+
+
+'''
+Sends the batch a crashed ship left behind, if shipped.json counted it.
+One written but never counted was never sent: its changes go out again
+in the next batch.
+'''
+
+def sendLeftover(transport, shipped):
+    try:
+        header, payload = readBatch(OUTGOING_FILE)
+    except (FileNotFoundError, ValueError):
+        return
+    if header.get("stream") == shipped["stream"] and header["seq"] == shipped["seq"]:
+        transport.send(header["seq"], header, payload)
+    os.remove(OUTGOING_FILE)
+
+
+'''
+Applies one op in the replica folder. An append that is already there
+(the batch was sent twice) is skipped; one that does not line up with
+the file means the replica has drifted from the primary.
+'''
+
+def applyOp(op, data):
+    path = op["path"]
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if op["op"] == "remove":
+        if os.path.exists(path):
+            os.remove(path)
+    elif op["op"] == "replace":
+        tempPath = path + ".tmp"
+        with open(tempPath, "wb") as f:
+            f.write(data)
+        os.replace(tempPath, path)
+    else:
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size >= op["at"] + len(data):
+            return
+        if size != op["at"]:
+            raise ReplicationError(f"{path} has {size} bytes, the primary appended at {op['at']}; "
+                                   f"ship a fresh copy (remove {SHIPPED_FILE} on the primary)")
+        with open(path, "ab") as f:
+            f.write(data)
+    datacache.invalidate(path)
+
+
+def profileRows(path):
+    try:
+        return {profile.accNo: profile for profile in datacache.rows(path)}
+    except FileNotFoundError:
+        return {}
+
+
+def applyBatch(header, payload):
+    changes = []
+    for op in header["ops"]:
+        data = payload[op["start"]:op["start"] + op["length"]] if "start" in op else b""
+        isProfiles = datacache.kind(op["path"]) == searchindex.PROFILES
+        before = profileRows(op["path"]) if isProfiles else None
+        applyOp(op, data)
+        if isProfiles:
+            after = profileRows(op["path"])
+            changes.extend((before.get(accNo), profile) for accNo, profile in after.items()
+                           if before.get(accNo) != profile)
+    # written after the profiles, so each line carries the signature of
+    # the file as it is now
+    searchindex.recordProfiles(changes)
+
+
+'''
+Applies every batch waiting in the inbox, in order. Returns how many
+were applied and the replica's lag afterwards.
+'''
+
+def applyPending(transport):
+    start = time.perf_counter()
+    applied = loadJson(APPLIED_FILE, {"seq": 0})
+    count = 0
+    for path in transport.pending():
+        header, payload = readBatch(path)
+        digest = batchDigest(header, payload)
+        if "stream" in applied and header.get("stream") != applied["stream"]:
+            if header["seq"] != 1:
+                raise ReplicationError(f"batch {header['seq']} comes from another run of the primary; "
+                                       f"remove it, or ship a fresh copy from batch 1")
+            # the primary started again from a fresh copy
+            applied = {"seq": 0}
+        if header["seq"] > applied["seq"] + 1:
+            raise ReplicationError(f"batch {applied['seq'] + 1} is missing (next one is {header['seq']})")
+        with dataLock():
+            if header["seq"] > applied["seq"]:
+                applyBatch(header, payload)
+                applied = {"stream": header.get("stream"), "seq": header["seq"], "sent": header["sent"],
+                           "last_txn_id": header["last_txn_id"], "applied": time.time(), "digest": digest}
+                saveJson(APPLIED_FILE, applied)
+                count += 1
+            elif header["seq"] == applied["seq"] and applied.get("digest", digest) != digest:
+                raise ReplicationError(f"batch {header['seq']} was applied already with different changes; "
+                                       f"the replica needs a fresh copy")
+        os.remove(path)
+    if count and os.path.exists(searchindex.INDEX_FILE):
+        searchindex.current()
+    return {"batches": count, "seq": applied["seq"], "lag": lag(), "seconds": time.perf_counter() - start}
+
+
+'''
+How far behind the primary this replica is, in seconds: the time since
+the primary sent the last batch applied here. None if nothing was
+applied yet.
+'''
+
+def lag():
+    applied = loadJson(APPLIED_FILE, None)
+    if applied is None:
+        return None
+    return max(time.time() - applied["sent"], 0.0)
+
+
+def status():
+    applied = loadJson(APPLIED_FILE, None)
+    if applied is None:
+        return None
+    return {"seq": applied["seq"], "as_of": applied["sent"], "last_txn_id": applied["last_txn_id"], "lag": lag()}
+
+
+'''
+Turns this process into a read-only replica reader: any attempt to take
+the data lock for writing fails from here on, and queries are refused
+once the data is more than maxLag seconds old.
+'''
+
+def enableReadOnly(maxLag=MAX_LAG):
+    locking.readOnly = True
+    limits["maxLag"] = maxLag
+
+
+def freshEnough():
+    current = lag()
+    return current is not None and current <= limits["maxLag"]
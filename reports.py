@@ -0,0 +1,281 @@
+"""
+Bank Reports
+-------------------------------
+
+Bank-wide numbers for the admin menu:
+
+- accounts and balances by account type, by status and by gender
+- inactive balance exposure (money sitting in Inactive accounts)
+- money in and out per month, split by transaction type
+- the top accounts by balance
+
+The data files are loaded into columns (one array per field, with
+text fields turned into small integer codes) and every report is a
+group-by over those columns, so no per-row dicts or lists are built.
+The group-bys are plain loops over the arrays (there is no numpy to
+hand them to), but they take well under a second at 2.3M ledger lines;
+nearly all the time goes on parsing the ledger.
+
+Finished reports are cached against the size and modification time of
+the files they came from, in memory and in a pickle outside the data
+folder (BANK_CACHE_DIR, the system temp folder by default, one file per
+data folder), so asking again without any change in between is instant
+and snapshots and the replica never carry it.
+"""
+
+
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+from array import array
+
+import ledger
+import shards
+from metrics import openFile
+
+
+CACHE_DIR = os.environ.get("BANK_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "bank-cache")
+SOURCE_FILES = [ledger.INDEX_FILE, ledger.ACTIVE_FILE]
+
+memoryCache = {}
+
+
+'''
+Maps text values to small integer codes and back, so a text column can
+be stored in an array.
+'''
+
+class Categories:
+
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.names)
+            self.names.append(value)
+        return code
+
+
+class AccountColumns:
+
+    def __init__(self):
+        self.accNos = []
+        self.rowOf = {}
+        self.balance = array("q")
+        self.accountType = array("h")
+        self.status = array("h")
+        self.gender = array("h")
+        self.types = Categories()
+        self.statuses = Categories()
+        self.genders = Categories()
+
+
+def loadAccounts():
+    columns = AccountColumns()
+    unknownType = columns.types.code("Unknown")
+    unknownStatus = columns.statuses.code("Unknown")
+    unknownGender = columns.genders.code("Unknown")
+
+    for path in shards.paths("AccountDetails.txt"):
+        with openFile(path, "r") as f:
+            for line in f:
+                parts = line.strip().split("|")
+                if len(parts) != 3:
+                    continue
+                try:
+                    cents = ledger.toCents(parts[2])
+                except ValueError:
+                    continue
+                columns.rowOf[parts[0]] = len(columns.accNos)
+                columns.accNos.append(parts[0])
+                columns.balance.append(cents)
+
+    count = len(columns.accNos)
+    columns.accountType = array("h", [unknownType]) * count
+    columns.status = array("h", [unknownStatus]) * count
+    columns.gender = array("h", [unknownGender]) * count
+
+    for path in shards.paths("CustomerProfiles.txt"):
+        try:
+            with openFile(path, "r") as f:
+                for line in f:
+                    parts = line.strip().split("|")
+                    if len(parts) < 10:
+                        continue
+                    row = columns.rowOf.get(parts[0])
+                    if row is None:
+                        continue
+                    columns.gender[row] = columns.genders.code(parts[7])
+                    columns.accountType[row] = columns.types.code(parts[8])
+                    columns.status[row] = columns.statuses.code(parts[9])
+        except FileNotFoundError:
+            pass
+
+    return columns
+
+
+class LedgerColumns:
+
+    def __init__(self):
+        self.month = array("h")
+        self.code = array("h")
+        self.cents = array("q")
+        self.months = Categories()
+        self.codes = Categories()
+
+
+'''
+Loads the whole ledger into three columns: month, type code, amount.
+Months are worked out once per hour of timestamps rather than once per
+line.
+'''
+
+def loadLedger():
+    columns = LedgerColumns()
+    monthOfHour = {}
+    monthCode = columns.months.code
+    typeCode = columns.codes.code
+
+    for path in ledger.segmentsFor():
+        try:
+            with ledger.openSegment(path) as f:
+                for line in f:
+                    # both formats, old lines through ledger.parseLegacy
+                    record = ledger.parseTransaction(line)
+                    if record is None:
+                        continue
+                    hour = record.epoch // 3600
+                    month = monthOfHour.get(hour)
+                    if month is None:
+                        month = monthOfHour[hour] = time.strftime("%Y-%m", time.localtime(record.epoch))
+
+                    columns.month.append(monthCode(month))
+                    columns.code.append(typeCode(record.code))
+                    columns.cents.append(record.cents)
+        except FileNotFoundError:
+            continue
+
+    return columns
+
+
+'''
+Group-by over columns: adds up values per group code and counts rows.
+Returns ([sums], [counts]) indexed by group code.
+'''
+
+def groupSum(groups, values, groupCount):
+    sums = [0] * groupCount
+    counts = [0] * groupCount
+    for group, value in zip(groups, values):
+        sums[group] += value
+        counts[group] += 1
+    return sums, counts
+
+
+def groupSum2(groupsA, groupsB, values, countB):
+    sums = {}
+    for a, b, value in zip(groupsA, groupsB, values):
+        key = a * countB + b
+        sums[key] = sums.get(key, 0) + value
+    return sums
+
+
+def breakdown(groups, categories, balances):
+    sums, counts = groupSum(groups, balances, len(categories.names))
+    return [[name, counts[code], sums[code] / 100]
+            for code, name in enumerate(categories.names) if counts[code]]
+
+
+def buildReports(top=10):
+    accounts = loadAccounts()
+    transactions = loadLedger()
+
+    byStatus = breakdown(accounts.status, accounts.statuses, accounts.balance)
+    inactiveCode = accounts.statuses.codes.get("Inactive")
+    if inactiveCode is None:
+        inactive = [0, 0.0]
+    else:
+        sums, counts = groupSum(accounts.status, accounts.balance, len(accounts.statuses.names))
+        inactive = [counts[inactiveCode], sums[inactiveCode] / 100]
+
+    codeCount = len(transactions.codes.names)
+    monthly = groupSum2(transactions.month, transactions.code, transactions.cents, codeCount)
+    monthRows = []
+    for monthCode, month in sorted(enumerate(transactions.months.names), key=lambda item: item[1]):
+        row = [month]
+        for code in ("OPEN", "DEP", "WDR", "XOUT", "XIN", "INT", "EMI", "MISC"):
+            typeIndex = transactions.codes.codes.get(code)
+            cents = 0 if typeIndex is None else monthly.get(monthCode * codeCount + typeIndex, 0)
+            row.append(cents / 100)
+        monthRows.append(row)
+
+    order = sorted(range(len(accounts.accNos)), key=accounts.balance.__getitem__, reverse=True)[:top]
+    topRows = [[accounts.accNos[row], accounts.types.names[accounts.accountType[row]],
+                accounts.statuses.names[accounts.status[row]], accounts.balance[row] / 100] for row in order]
+
+    return {
+        "accounts": len(accounts.accNos),
+        "transactions": len(transactions.cents),
+        "total_balance": sum(accounts.balance) / 100,
+        "by_type": breakdown(accounts.accountType, accounts.types, accounts.balance),
+        "by_status": byStatus,
+        "by_gender": breakdown(accounts.gender, accounts.genders, accounts.balance),
+        "inactive_exposure": inactive,
+        "monthly": monthRows,
+        "top_accounts": topRows,
+    }
+
+
+def sourceKey():
+    key = []
+    for path in shards.paths("AccountDetails.txt") + shards.paths("CustomerProfiles.txt") + SOURCE_FILES:
+        try:
+            info = os.stat(path)
+            key.append((path, info.st_mtime_ns, info.st_size))
+        except FileNotFoundError:
+            key.append((path, None, None))
+    return tuple(key)
+
+
+def cacheFile():
+    folder = hashlib.sha1(os.path.abspath(".").encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"reports-{folder}.pickle")
+
+
+'''
+Returns the reports, from cache when none of the source files have
+changed since they were built.
+'''
+
+def getReports(top=10):
+    key = (sourceKey(), top)
+    if memoryCache.get("key") == key:
+        return memoryCache["reports"]
+
+    cachePath = cacheFile()
+    try:
+        with open(cachePath, "rb") as f:
+            cached = pickle.load(f)
+        if cached.get("key") == key:
+            memoryCache.update(cached)
+            return cached["reports"]
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        pass
+
+    reports = buildReports(top)
+    memoryCache["key"] = key
+    memoryCache["reports"] = reports
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tempPath = f"{cachePath}.{os.getpid()}.tmp"
+        with open(tempPath, "wb") as f:
+            pickle.dump({"key": key, "reports": reports}, f)
+        os.replace(tempPath, cachePath)
+    except OSError:
+        pass
+    return reports
@@ -0,0 +1,185 @@
+"""
+Velocity Screening
+-------------------------------
+
+Stops an account from being drained quickly: before a withdrawal or a
+transfer goes through, it is checked against how many debits the
+account already had, and for how much, in the last minute, hour and
+day.
+
+Without a rules file it uses DEFAULT_RULES:
+
+    at most 10 debits and Rs.5000000 in a minute
+    at most 50 debits and Rs.20000000 in an hour
+    at most 200 debits and Rs.50000000 in a day
+
+The bank can set its own in screening_rules.txt, one per line:
+
+    window in seconds|most debits|most money (Rs.)
+
+for example
+
+    60|10|5000000
+    86400|200|50000000
+
+A rules file replaces the defaults as a whole; an empty one turns
+screening off. The limits have to sit well above anything a customer
+really does: a single large withdrawal over them is refused, not queued
+for a look.
+Standing orders are screened like any other transfer.
+
+The counts are kept in memory per account, one sliding window per rule
+(a deque of (time, cents) with a running total), so a check only drops
+the debits that fell out of each window and adds up nothing. They are
+filled from the ledger: on the first check (or after the ledger was
+rotated) from the last day of it, and after that by reading just the
+lines added to transactions.txt since the last check (see tailer.py),
+so debits made by other processes count too.
+
+check() has to be called holding the data lock, right before the debit
+is written.
+"""
+
+
+import time
+from collections import deque
+
+import datacache
+import ledger
+from records import toCents
+from tailer import LogTail
+
+
+RULES_FILE = "screening_rules.txt"
+
+# window in seconds|most debits|most money in Rs., used without a rules
+# file; far above a normal day, so they only stop an account being drained
+DEFAULT_RULES = [
+    ["60", "10", "5000000"],
+    ["3600", "50", "20000000"],
+    ["86400", "200", "50000000"],
+]
+
+WINDOW_NAMES = {60: "minute", 3600: "hour", 86400: "day"}
+
+# every this many debits, accounts with nothing left in any window are dropped
+SWEEP_AFTER = 10000
+
+tail = LogTail(ledger.ACTIVE_FILE)
+state = {"rules": None, "source": None, "accounts": {}, "added": 0}
+
+
+class Activity:
+    __slots__ = ("windows", "last")
+
+    def __init__(self, rules):
+        # per rule: [debits in the window as (epoch, cents), total cents]
+        self.windows = [[deque(), 0] for rule in rules]
+        self.last = 0
+
+    def add(self, epoch, cents):
+        for window in self.windows:
+            window[0].append((epoch, cents))
+            window[1] += cents
+        self.last = max(self.last, epoch)
+
+    def slide(self, rules, now):
+        for (seconds, maxCount, maxCents), window in zip(rules, self.windows):
+            debits = window[0]
+            while debits and debits[0][0] <= now - seconds:
+                window[1] -= debits.popleft()[1]
+
+
+def loadRules():
+    try:
+        rows = datacache.rows(RULES_FILE)
+    except FileNotFoundError:
+        rows = None
+    if state["rules"] is not None and state["source"] is rows:
+        return state["rules"]
+
+    rules = []
+    for row in rows if rows is not None else DEFAULT_RULES:
+        try:
+            rules.append((int(row[0]), int(row[1]), toCents(row[2])))
+        except (IndexError, ValueError):
+            continue
+    rules.sort()
+    state.update(rules=rules, source=rows, accounts={}, added=0)
+    # new windows have to be filled from the ledger again
+    tail.reset()
+    return rules
+
+
+def windowName(seconds):
+    return WINDOW_NAMES.get(seconds, f"{seconds} seconds")
+
+
+def addLines(lines, since):
+    for line in lines:
+        record = ledger.parseTransaction(line)
+        if record is None or record.signedCents >= 0 or record.epoch <= since:
+            continue
+        addDebit(record.accNo, record.epoch, record.cents)
+
+
+def addDebit(accNo, epoch, cents):
+    activity = state["accounts"].get(accNo)
+    if activity is None:
+        activity = state["accounts"][accNo] = Activity(state["rules"])
+    activity.add(epoch, cents)
+    state["added"] += 1
+
+
+def sweep(now):
+    longest = state["rules"][-1][0] if state["rules"] else 0
+    accounts = state["accounts"]
+    for accNo in [accNo for accNo, activity in accounts.items() if activity.last <= now - longest]:
+        del accounts[accNo]
+    state["added"] = 0
+
+
+def refresh(rules, now):
+    longest = rules[-1][0] if rules else 0
+    newLines, reset = tail.poll()
+    if reset:
+        state["accounts"] = {}
+        since = now - longest
+        # the start of the window may be in a closed month
+        stamp = ledger.epochToStamp(since)
+        for path in ledger.segmentsFor(stamp):
+            if path != ledger.ACTIVE_FILE:
+                addLines(ledger.segmentLines(path), since)
+        addLines(newLines, since)
+    else:
+        addLines(newLines, now - longest)
+    if state["added"] >= SWEEP_AFTER:
+        sweep(now)
+
+
+'''
+Returns None if accNo may take amount out now, or a message saying
+which rule it would break. pending is the cents of debits already let
+through but not in the ledger yet (earlier transfers of the same
+batch, see transfers.py).
+'''
+
+def check(accNo, amount, pending=()):
+    rules = loadRules()
+    if not rules:
+        return None
+    now = time.time()
+    refresh(rules, now)
+    activity = state["accounts"].get(accNo)
+    if activity is None:
+        activity = Activity(rules)
+    activity.slide(rules, now)
+    cents = toCents(amount) + sum(pending)
+    for (seconds, maxCount, maxCents), (debits, total) in zip(rules, activity.windows):
+        count = len(debits) + len(pending)
+        if count + 1 > maxCount:
+            return f"account {accNo} already had {count} debits in the last {windowName(seconds)}"
+        if total + cents > maxCents:
+            return (f"account {accNo} would take out more than Rs.{maxCents / 100:.2f} "
+                    f"in a {windowName(seconds)}")
+    return None
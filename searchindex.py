@@ -0,0 +1,294 @@
+"""
+Customer Search Index
+-------------------------------
+
+Finds customers by name or address even when the spelling is a bit
+off ("BAASIT" finds "BAASITH"), without reading CustomerProfiles.txt
+for every search.
+
+Each word is cut into trigrams (pieces of three letters, padded with
+spaces so the start and end of the word count too). Two words are as
+similar as the share of trigrams they have in common, and a customer
+scores the average over the words searched for of how close their best
+matching word is.
+
+The index works on distinct values rather than on customers: thousands
+of customers living at "KKY" are one entry, with the list of their
+account numbers. A search only scores the values that share trigrams
+with what was typed, and then hands out account numbers from the best
+values first until it has enough.
+
+    search_index.pickle   the whole index, as of some moment
+    search_index.log      one line per profile written since then:
+                          accNo|old name|old address|new name|new address|file|ino|size|mtime
+
+createAccount, the profile edits and the batch profile job add a line to
+search_index.log after writing CustomerProfiles.txt (under the data
+lock), so the index is brought up to date by reading just those lines.
+If CustomerProfiles.txt (or one of its shards, see shards.py) was
+changed some other way (a restore, an edit by hand) the index no longer
+matches it and is built again from the files.
+"""
+
+
+import os
+import pickle
+import re
+from array import array
+from collections import Counter
+
+import datacache
+import shards
+import locking
+from locking import dataLock
+from metrics import openFile
+from tailer import LogTail
+
+
+PROFILES = "CustomerProfiles.txt"
+INDEX_FILE = "search_index.pickle"
+JOURNAL_FILE = "search_index.log"
+FIELDS = ("name", "address")
+
+# the journal is folded into the pickle once it is this long
+COMPACT_AFTER = 5000
+THRESHOLD = 0.3
+
+WORD = re.compile(r"[A-Z0-9]+")
+
+journal = LogTail(JOURNAL_FILE)
+state = {"fields": None, "sig": None, "pending": 0}
+
+
+def words(value):
+    return WORD.findall(value.upper())
+
+
+def trigrams(word):
+    padded = "  " + word + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(grams, other):
+    shared = len(grams & other)
+    return shared / (len(grams) + len(other) - shared)
+
+
+class FieldIndex:
+
+    def __init__(self):
+        self.values = []          # value id -> value
+        self.ids = {}             # value -> value id
+        self.accounts = []        # value id -> account numbers
+        self.grams = {}           # trigram -> value ids
+
+    def valueId(self, value):
+        valueId = self.ids.get(value)
+        if valueId is None:
+            valueId = len(self.values)
+            self.values.append(value)
+            self.ids[value] = valueId
+            self.accounts.append(array("L"))
+            grams = set()
+            for word in words(value):
+                grams |= trigrams(word)
+            for gram in grams:
+                self.grams.setdefault(gram, array("L")).append(valueId)
+        return valueId
+
+    def add(self, value, accNo):
+        self.accounts[self.valueId(value)].append(accNo)
+
+    def remove(self, value, accNo):
+        valueId = self.ids.get(value)
+        if valueId is None:
+            return
+        try:
+            self.accounts[valueId].remove(accNo)
+        except ValueError:
+            pass
+
+    '''
+    Returns up to top (score, accNo) pairs, best first.
+    '''
+
+    def search(self, query, top):
+        queryGrams = [trigrams(word) for word in words(query)]
+        if not queryGrams:
+            return []
+
+        hits = Counter()
+        for gram in set().union(*queryGrams):
+            hits.update(self.grams.get(gram, ()))
+
+        # a value can only reach THRESHOLD if at least one word searched for
+        # shares that much of its trigrams with it
+        needed = THRESHOLD * min(len(grams) for grams in queryGrams)
+        wordGrams = {}
+        scored = []
+        for valueId, count in hits.items():
+            if count < needed or not self.accounts[valueId]:
+                continue
+            total = 0.0
+            for grams in queryGrams:
+                best = 0.0
+                for word in words(self.values[valueId]):
+                    other = wordGrams.get(word)
+                    if other is None:
+                        other = wordGrams[word] = trigrams(word)
+                    best = max(best, similarity(grams, other))
+                total += best
+            score = total / len(queryGrams)
+            if score >= THRESHOLD:
+                scored.append((-score, self.values[valueId], valueId))
+        scored.sort()
+
+        found = []
+        for negative, value, valueId in scored:
+            for accNo in self.accounts[valueId]:
+                found.append((-negative, str(accNo)))
+                if len(found) >= top:
+                    return found
+        return found
+
+
+'''
+{file: signature} of every profile file, to tell whether the index still
+matches them.
+'''
+
+def signatures():
+    return {filePath: datacache.signature(filePath) for filePath in shards.paths(PROFILES)}
+
+
+def build():
+    fields = {field: FieldIndex() for field in FIELDS}
+    for profile in shards.rows(PROFILES):
+        if not profile.accNo.isdigit():
+            continue
+        accNo = int(profile.accNo)
+        for field in FIELDS:
+            fields[field].add(getattr(profile, field), accNo)
+    return fields
+
+
+'''
+Writes the index to the pickle and empties the journal. Call it holding
+the data lock exclusively. The temporary file is per process, so a
+save that races one from another process cannot pull it away.
+'''
+
+def save():
+    tempPath = f"{INDEX_FILE}.{os.getpid()}.tmp"
+    with open(tempPath, "wb") as f:
+        pickle.dump({"sig": state["sig"], "fields": state["fields"]}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tempPath, INDEX_FILE)
+    # everything in the journal is in the pickle now
+    with openFile(JOURNAL_FILE, "w"):
+        pass
+    journal.poll()
+    state["pending"] = 0
+
+
+def loadSaved():
+    try:
+        with open(INDEX_FILE, "rb") as f:
+            saved = pickle.load(f)
+        if not isinstance(saved["sig"], dict):
+            # saved before the profiles could be split into shards
+            return False
+        state["fields"] = saved["fields"]
+        state["sig"] = saved["sig"]
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, KeyError, ValueError):
+        return False
+    state["pending"] = 0
+    return True
+
+
+def applyLine(line):
+    parts = line.rstrip("\n").split("|")
+    if len(parts) != 9:
+        return
+    accNo, oldName, oldAddress, newName, newAddress, filePath = parts[:6]
+    state["sig"][filePath] = tuple(int(part) for part in parts[6:])
+    state["pending"] += 1
+    if not accNo.isdigit():
+        return
+    accNo = int(accNo)
+    fields = state["fields"]
+    for field, old, new in (("name", oldName, newName), ("address", oldAddress, newAddress)):
+        if old == new:
+            continue
+        if old:
+            fields[field].remove(old, accNo)
+        fields[field].add(new, accNo)
+
+
+'''
+Loads the saved index if there is nothing in memory (or the journal
+was started again by a save), then applies what the journal added.
+'''
+
+def catchUp():
+    newLines, reset = journal.poll()
+    if state["fields"] is None or reset:
+        # a new journal goes with a new pickle; with no pickle at all the
+        # index built in memory still stands, and the journal adds to it
+        if not loadSaved() and state["fields"] is None:
+            newLines = []
+    if state["fields"] is not None:
+        for line in newLines:
+            applyLine(line)
+
+
+'''
+Brings the index up to date with CustomerProfiles.txt and returns it
+({field: FieldIndex}). That happens under the shared lock (building it
+again in memory if the files changed some other way); only then, under
+the exclusive lock, is it written out if that is worth doing, so nothing
+is written while readers hold the lock together. A read-only replica, or
+a caller already holding the lock shared, keeps it in memory only.
+'''
+
+def current():
+    with dataLock(shared=True):
+        catchUp()
+        if state["fields"] is None or state["sig"] != signatures():
+            state["fields"] = build()
+            state["sig"] = signatures()
+            # a fresh build is always worth writing out
+            state["pending"] = COMPACT_AFTER
+        fields = state["fields"]
+
+    heldShared = locking.state["depth"] and locking.state["shared"]
+    if state["pending"] >= COMPACT_AFTER and not locking.readOnly and not heldShared:
+        with dataLock():
+            # a writer may have got in between the two holds
+            catchUp()
+            if state["fields"] is not None and state["sig"] == signatures():
+                save()
+                fields = state["fields"]
+    return fields
+
+
+def search(field, query, top=10):
+    return current()[field].search(query, top)
+
+
+'''
+Notes profile writes in the journal: a list of (old profile or None for
+a new customer, new profile). Call it while still holding the data lock, right
+after CustomerProfiles.txt was written.
+'''
+
+def recordProfiles(changes):
+    if not changes:
+        return
+    lines = []
+    for old, new in changes:
+        filePath = shards.path(PROFILES, new.accNo)
+        sig = "|".join(str(part) for part in datacache.signature(filePath))
+        oldName, oldAddress = (old.name, old.address) if old else ("", "")
+        lines.append(f"{new.accNo}|{oldName}|{oldAddress}|{new.name}|{new.address}|{filePath}|{sig}\n")
+    with openFile(JOURNAL_FILE, "a") as f:
+        f.write("".join(lines))
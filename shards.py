@@ -0,0 +1,224 @@
+"""
+Shards
+-------------------------------
+
+Splits AccountDetails.txt and CustomerProfiles.txt by account number
+range, so a deposit rewrites only the accounts of its own range and a
+lookup or scan reads only the part of the bank it needs.
+
+    shards.txt                      one line per shard: name|first|last
+                                    (last is empty for the newest shard,
+                                    which takes every account after first)
+    shards/<name>/AccountDetails.txt
+    shards/<name>/CustomerProfiles.txt
+
+Without shards.txt nothing is split and the two files stay at the top
+of the data folder, as before. "python banking_app.py --job shard
+--shards N" splits an existing data folder into N ranges of equal size.
+A shard folder can be a mount point or a link to another disk.
+
+Everything else (credentials, the ledger, the logs and the data lock)
+stays shared by all shards.
+
+Changes that touch more than one shard (a transfer between two ranges,
+monthly interest) first write the new rows to shards/pending.txt and
+remove it when every shard is written. If the app stops in between, the
+next process to take the data lock finishes the job from that file
+before doing anything else.
+"""
+
+
+import bisect
+import os
+import time
+
+import datacache
+import locking
+from metrics import openFile
+
+
+CONFIG_FILE = "shards.txt"
+SHARD_DIR = "shards"
+PENDING_FILE = os.path.join(SHARD_DIR, "pending.txt")
+ACCOUNTS = "AccountDetails.txt"
+PROFILES = "CustomerProfiles.txt"
+SHARDED = (ACCOUNTS, PROFILES)
+
+layoutCache = {"rows": None, "firsts": [], "folders": []}
+
+
+'''
+The shards as (first account number, folder), lowest range first, or an
+empty list when the data folder is not split. Follows shards.txt
+through the data cache, so a change to it (a restore) is picked up.
+'''
+
+def layout():
+    try:
+        rows = datacache.rows(CONFIG_FILE)
+    except FileNotFoundError:
+        return []
+    if layoutCache["rows"] is not rows:
+        shards = sorted((int(row[1]), os.path.join(SHARD_DIR, row[0])) for row in rows if len(row) == 3)
+        layoutCache["firsts"] = [first for first, folder in shards]
+        layoutCache["folders"] = [folder for first, folder in shards]
+        layoutCache["rows"] = rows
+    return list(zip(layoutCache["firsts"], layoutCache["folders"]))
+
+
+def folderOf(accNo):
+    if not layout():
+        return None
+    number = int(accNo) if accNo.isdigit() else 0
+    position = max(bisect.bisect_right(layoutCache["firsts"], number) - 1, 0)
+    return layoutCache["folders"][position]
+
+
+'''
+The file (AccountDetails.txt or CustomerProfiles.txt) holding accNo.
+'''
+
+def path(name, accNo):
+    folder = folderOf(accNo)
+    return name if folder is None else os.path.join(folder, name)
+
+
+'''
+Every file of that name, lowest account range first.
+'''
+
+def paths(name):
+    shards = layout()
+    if not shards:
+        return [name]
+    return [os.path.join(folder, name) for first, folder in shards]
+
+
+def folders():
+    return [folder for first, folder in layout()]
+
+
+def rows(name):
+    for filePath in paths(name):
+        yield from datacache.rows(filePath)
+
+
+def lookup(name, accNo):
+    return datacache.lookup(path(name, accNo), accNo)
+
+
+def byPath(name, records):
+    grouped = {}
+    for record in records:
+        grouped.setdefault(path(name, record.accNo), []).append(record)
+    return grouped
+
+
+def appendRows(name, newRows):
+    for filePath, group in byPath(name, newRows).items():
+        datacache.appendRows(filePath, group)
+
+
+'''
+Like datacache.updateRows ({accNo: new record}), over however many
+shards the records live in. Call it holding the data lock.
+'''
+
+def updateRows(name, changed):
+    grouped = byPath(name, changed.values())
+    if len(grouped) > 1:
+        datacache.writeAtomically(PENDING_FILE, f"{name}\n" + datacache.formatRows(name, changed.values()))
+    for filePath, group in grouped.items():
+        datacache.updateRows(filePath, {record.accNo: record for record in group})
+    if len(grouped) > 1:
+        os.remove(PENDING_FILE)
+
+
+'''
+Writes out a change to several shards that was cut short. The file has
+the data file name on its first line and the new rows after it; writing
+them again is harmless when some shards already have them.
+'''
+
+def finishPending():
+    try:
+        with openFile(PENDING_FILE, "r") as f:
+            name = f.readline().strip()
+            pending = datacache.parse(name, f)
+    except FileNotFoundError:
+        return 0
+    for filePath, group in byPath(name, pending).items():
+        datacache.updateRows(filePath, {record.accNo: record for record in group})
+    os.remove(PENDING_FILE)
+    return len(pending)
+
+
+locking.recoveries.append(finishPending)
+
+
+'''
+The highest account number in use, looking only at the newest shard that
+has any accounts (numbers are handed out in order, so the highest
+one is always in the last range that is not empty).
+'''
+
+def highestAccount(floor):
+    highest = floor
+    for filePath in reversed(paths(ACCOUNTS)):
+        try:
+            accounts = datacache.rows(filePath)
+        except FileNotFoundError:
+            continue
+        for account in accounts:
+            if account.accNo.isdigit() and int(account.accNo) > highest:
+                highest = int(account.accNo)
+        if accounts:
+            break
+    return highest
+
+
+'''
+Splits an unsplit data folder into count shards of about the same number
+of accounts. Returns the new layout and how long it took. Call it
+holding the data lock.
+'''
+
+def split(count):
+    start = time.perf_counter()
+    if layout():
+        raise ValueError(f"the data folder is already split into {len(layout())} shards")
+    accounts = datacache.rows(ACCOUNTS)
+    numbers = sorted({int(account.accNo) for account in accounts if account.accNo.isdigit()})
+    count = max(1, min(count, len(numbers)))
+    firsts = [numbers[len(numbers) * i // count] for i in range(count)] if numbers else [0]
+    firsts[0] = 0
+    names = [f"{i + 1:02d}" for i in range(len(firsts))]
+
+    def folderFor(accNo):
+        number = int(accNo) if accNo.isdigit() else 0
+        return os.path.join(SHARD_DIR, names[bisect.bisect_right(firsts, number) - 1])
+
+    for name in SHARDED:
+        try:
+            records = datacache.rows(name)
+        except FileNotFoundError:
+            records = []
+        grouped = {os.path.join(SHARD_DIR, shard): [] for shard in names}
+        for record in records:
+            grouped[folderFor(record.accNo)].append(record)
+        for folder, group in grouped.items():
+            os.makedirs(folder, exist_ok=True)
+            datacache.rewriteRows(os.path.join(folder, name), group)
+
+    config = []
+    for i, shard in enumerate(names):
+        last = str(firsts[i + 1] - 1) if i + 1 < len(names) else ""
+        config.append([shard, str(firsts[i]), last])
+    # shards.txt is what switches the app over, so it is written last
+    datacache.rewriteRows(CONFIG_FILE, config)
+
+    for name in SHARDED:
+        if os.path.exists(name):
+            os.remove(name)
+        datacache.invalidate(name)
+    return {"layout": layout(), "seconds": time.perf_counter() - start}
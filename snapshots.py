@@ -0,0 +1,246 @@
+"""
+Snapshots
+-------------------------------
+
+Point-in-time copies of the whole data folder, and restoring from them.
+
+    snapshots/YYYYMMDD-HHMMSS/       one folder per snapshot
+    snapshots/.../manifest.json      when it was taken, the last ledger
+                                     transaction id, and every file in it
+
+A snapshot is taken while holding the data lock shared (see locking.py),
+so no change is half-way through while the files are copied.
+
+- the data files (with shards.txt and every shard's files, see
+  shards.py), today's summary and the ledger index are copied
+- files that never change once written (the gzip ledger segments, audit
+  archives and the summaries of past days) are hard-linked instead, so
+  a snapshot costs almost nothing for the bulk of the history
+
+Restoring to a point in time puts back the newest snapshot taken before
+it and then replays every ledger transaction after the snapshot up to
+that time: the ledger lines are appended again and each account gets
+the balance its last replayed transaction left it with. Replayed
+interest is written to interestlog.txt again too, so the next interest
+run knows it was already paid, and the references of replayed movements
+are remembered again (see idempotency.py), so a retry does not pay
+twice. Profile edits and new accounts made
+after the snapshot are not replayed.
+
+Before restoring, the current state is saved as a snapshot of its own,
+so a restore can itself be undone.
+"""
+
+
+import json
+import os
+import shutil
+import time
+
+import datacache
+import idempotency
+import ledger
+import shards
+import summaries
+from locking import dataLock
+from metrics import openFile
+
+
+SNAPSHOT_DIR = "snapshots"
+DATA_FILES = ["AccountDetails.txt", "CustomerProfiles.txt", "credentials.txt", "transactions.txt",
+              "change_log.txt", "deactivation_log.txt", "interestlog.txt", shards.CONFIG_FILE,
+              "standing_orders.txt", "standing_orders_log.txt", "idempotency.log"]
+FOLDERS = [ledger.LEDGER_DIR, summaries.SUMMARY_DIR, "audit"]
+
+
+def immutable(relPath):
+    if relPath.endswith(".gz"):
+        return True
+    if relPath.startswith(summaries.SUMMARY_DIR + os.sep):
+        return os.path.basename(relPath)[:-4] < time.strftime("%Y-%m-%d")
+    return False
+
+
+def dataFiles():
+    paths = [name for name in DATA_FILES if os.path.exists(name)]
+    for folder in FOLDERS + shards.folders():
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if os.path.isfile(path) and not name.endswith(".tmp"):
+                paths.append(path)
+    return paths
+
+
+def lastTxnId():
+    try:
+        with openFile(ledger.SEQUENCE_FILE, "r") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def place(source, target, link):
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    if link:
+        try:
+            os.link(source, target)
+            return "link"
+        except OSError:
+            pass
+    shutil.copy2(source, target)
+    return "copy"
+
+
+'''
+Takes a snapshot and returns its manifest (with how long it took).
+'''
+
+def takeSnapshot(label=None):
+    start = time.perf_counter()
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+
+    with dataLock(shared=True):
+        taken = time.time()
+        name = time.strftime("%Y%m%d-%H%M%S", time.localtime(taken))
+        if label:
+            name += "-" + label
+        folder = os.path.join(SNAPSHOT_DIR, name)
+        counter = 1
+        while os.path.exists(folder):
+            counter += 1
+            folder = os.path.join(SNAPSHOT_DIR, f"{name}-{counter}")
+        tempFolder = folder + ".tmp"
+
+        files = {}
+        for relPath in dataFiles():
+            files[relPath] = place(relPath, os.path.join(tempFolder, relPath), immutable(relPath))
+        manifest = {"time": taken, "last_txn_id": lastTxnId(), "files": files}
+
+    with open(os.path.join(tempFolder, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tempFolder, folder)
+
+    manifest["folder"] = folder
+    manifest["seconds"] = time.perf_counter() - start
+    return manifest
+
+
+def listSnapshots():
+    found = []
+    try:
+        names = sorted(os.listdir(SNAPSHOT_DIR))
+    except FileNotFoundError:
+        return found
+    for name in names:
+        try:
+            with open(os.path.join(SNAPSHOT_DIR, name, "manifest.json")) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, NotADirectoryError, ValueError):
+            continue
+        manifest["folder"] = os.path.join(SNAPSHOT_DIR, name)
+        found.append(manifest)
+    found.sort(key=lambda manifest: manifest["time"])
+    return found
+
+
+'''
+Restores the data folder as it was just before the given time (epoch
+seconds, None for now). Returns a small dict describing what was done.
+'''
+
+def restore(at=None):
+    start = time.perf_counter()
+    at = time.time() if at is None else at
+    candidates = [manifest for manifest in listSnapshots() if manifest["time"] < at]
+    if not candidates:
+        raise FileNotFoundError("no snapshot taken before that time")
+    snapshot = candidates[-1]
+
+    with dataLock():
+        # everything the ledger holds after the snapshot, up to the restore time
+        since = ledger.epochToStamp(int(snapshot["time"]))
+        replay = [record for record in ledger.readTransactions(since)
+                  if record.txnId is not None and record.txnId > snapshot["last_txn_id"] and record.epoch < at]
+        # ids already handed out are never reused, even if their transactions are dropped
+        highestId = lastTxnId()
+        references = idempotency.logEntries()
+        safety = takeSnapshot("before-restore")
+
+        current = set(dataFiles())
+        for relPath in current - set(snapshot["files"]):
+            os.remove(relPath)
+        for relPath in snapshot["files"]:
+            source = os.path.join(snapshot["folder"], relPath)
+            if os.path.exists(relPath) and os.path.samefile(source, relPath):
+                # already a hard link to the snapshot's own copy
+                continue
+            tempPath = relPath + ".restore"
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+            place(source, tempPath, immutable(relPath))
+            os.replace(tempPath, relPath)
+        datacache.invalidate()
+        summaries.dayCache["day"] = None
+
+        skipped = replayTransactions(replay, highestId, references)
+
+    return {
+        "snapshot": snapshot["folder"],
+        "safety_snapshot": safety["folder"],
+        "replayed": len(replay),
+        "skipped_accounts": skipped,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+'''
+Appends the replayed transactions to the restored ledger and sets each
+account's balance to where its last one left it. Accounts that did not
+exist in the snapshot are left out and returned. references are the
+idempotency log entries from before the restore.
+'''
+
+def replayTransactions(records, highestId, references=()):
+    os.makedirs(ledger.LEDGER_DIR, exist_ok=True)
+    with openFile(ledger.SEQUENCE_FILE, "w") as f:
+        f.write(f"{highestId}\n")
+    if not records:
+        return []
+
+    known = {account.accNo for account in shards.rows("AccountDetails.txt")}
+    skipped = sorted({record.accNo for record in records if record.accNo not in known})
+    records = [record for record in records if record.accNo in known]
+
+    datacache.appendLines(ledger.ACTIVE_FILE, [record.toJson() + "\n" for record in records])
+
+    balances = {}
+    movements = []
+    for record in records:
+        if record.balanceCents is not None:
+            balances[record.accNo] = record.balance
+            movements.append((record.accNo, record.stamp()[:10], record.signedCents / 100, record.balance))
+    if balances:
+        shards.updateRows("AccountDetails.txt",
+                          {accNo: shards.lookup("AccountDetails.txt", accNo).withBalance(balance)
+                           for accNo, balance in balances.items()})
+    summaries.recordMovements(movements)
+
+    # the restored interestlog.txt is from before the snapshot; without
+    # these lines the replayed interest would be paid again this month
+    interestRows = []
+    for record in records:
+        if record.code == "INT" and record.balanceCents is not None:
+            before = record.balanceCents - record.cents
+            rate = record.cents / before * 100 if before else 0.0
+            interestRows.append([record.accNo, record.stamp()[:10], f"{record.amount:.2f}", f"{rate:.2f}%"])
+    if interestRows:
+        datacache.appendRows("interestlog.txt", interestRows)
+
+    # the references whose movements are all back in the ledger; the rest
+    # were undone by the restore and may be used again
+    replayed = {record.txnId for record in records}
+    idempotency.rememberEntries([entry for entry in references
+                                 if entry["result"] and all(txnId in replayed for txnId in entry["result"])])
+    return skipped
@@ -0,0 +1,245 @@
+"""
+Standing Orders
+-------------------------------
+
+Transfers that repeat by themselves (rent every month, savings every
+week) instead of someone running Transfer Money by hand each time.
+
+    standing_orders.txt       orderId|fromAcc|toAcc|amount|every|next due|status|first due
+                              every is daily, weekly or monthly, the due
+                              times are epoch seconds, status Active or
+                              Cancelled (orders added before first due was
+                              kept count from their next due)
+    standing_orders_log.txt   orderId|due|done/repeat/refused|transaction ids or reason
+
+A monthly order keeps the day of the month of its first due time: one
+that starts on 31 January is paid on 28 (or 29) February and then on
+31 March again.
+
+"python banking_app.py --job standing-orders" (with --interval to keep
+it running) makes every transfer that is due.
+
+The orders are kept in a heap on their next due time, so a run only
+looks at the orders that are due, not at all of them. The heap is built
+once per process and only built again when standing_orders.txt was
+changed by another process (a new or cancelled order).
+
+Due orders are done BATCH_SIZE at a time through transfers.transferMany,
+with the balance checks and velocity screening of Transfer Money. Each
+batch takes the data lock on its own, so other work gets in between. A
+transfer that is refused is logged and the order waits for its next due
+time. After downtime every missed due time is caught up, oldest first.
+
+The log is written before the orders are moved on, and a due time the
+log already has as done is never paid again, however long the app was
+down. Each transfer also carries the reference SO<orderId>-<due time>,
+which covers the moment between the money moving and the log line
+being written (see idempotency.py).
+"""
+
+
+import calendar
+import datetime
+import heapq
+import time
+
+import datacache
+import ledger
+import shards
+import transfers
+from locking import dataLock
+
+
+STORE_FILE = "standing_orders.txt"
+LOG_FILE = "standing_orders_log.txt"
+FREQUENCIES = ("daily", "weekly", "monthly")
+BATCH_SIZE = 5000
+
+scheduler = {"sig": None, "heap": []}
+# (orderId, due stamp) of every due time the log has as paid
+paid = {"rows": None, "seen": 0, "keys": set()}
+
+
+'''
+The due time after epoch. A monthly order goes on the day of the month
+of anchor (its first due time), or the last day of a shorter month.
+'''
+
+def nextDue(epoch, every, anchor=None):
+    moment = datetime.datetime.fromtimestamp(epoch)
+    if every == "daily":
+        moment += datetime.timedelta(days=1)
+    elif every == "weekly":
+        moment += datetime.timedelta(days=7)
+    else:
+        day = datetime.datetime.fromtimestamp(anchor if anchor is not None else epoch).day
+        year, month = divmod(moment.month, 12)
+        year, month = moment.year + year, month + 1
+        moment = moment.replace(year=year, month=month, day=min(day, calendar.monthrange(year, month)[1]))
+    return int(time.mktime(moment.timetuple()))
+
+
+def anchorOf(order):
+    return int(order[7]) if len(order) > 7 else int(order[5])
+
+
+def orderRows():
+    try:
+        return datacache.rows(STORE_FILE)
+    except FileNotFoundError:
+        return []
+
+
+'''
+The heap of (next due, orderId) for the active orders, built again only
+when the store was changed outside this process.
+'''
+
+def schedule():
+    try:
+        sig = datacache.signature(STORE_FILE)
+    except FileNotFoundError:
+        sig = None
+    if sig != scheduler["sig"]:
+        heap = [(int(row[5]), row[0]) for row in orderRows() if len(row) >= 7 and row[6] == "Active"]
+        heapq.heapify(heap)
+        scheduler.update(sig=sig, heap=heap)
+    return scheduler["heap"]
+
+
+'''
+Notes our own write to the store, so it does not make the heap be built
+again. Only when the heap was up to date just before it.
+'''
+
+def wrote(before):
+    if before == scheduler["sig"]:
+        scheduler["sig"] = datacache.signature(STORE_FILE)
+        return True
+    return False
+
+
+def addOrder(fromAcc, toAcc, amount, every, firstDue):
+    if every not in FREQUENCIES:
+        raise ValueError(f"every has to be one of {', '.join(FREQUENCIES)}")
+    with dataLock():
+        rows = orderRows()
+        orderId = str(int(rows[-1][0]) + 1 if rows else 1)
+        heap = schedule()
+        before = scheduler["sig"]
+        datacache.appendRows(STORE_FILE, [[orderId, fromAcc, toAcc, f"{amount:.2f}", every,
+                                           str(int(firstDue)), "Active", str(int(firstDue))]])
+        if wrote(before):
+            heapq.heappush(heap, (int(firstDue), orderId))
+    return orderId
+
+
+def cancelOrder(orderId):
+    with dataLock():
+        order = datacache.lookup(STORE_FILE, orderId) if orderRows() else None
+        if order is None or order[6] != "Active":
+            return False
+        # left in the heap; skipped when it comes up
+        schedule()
+        before = scheduler["sig"]
+        datacache.updateRows(STORE_FILE, {orderId: order[:6] + ["Cancelled"] + order[7:]})
+        wrote(before)
+    return True
+
+
+def ordersFor(accNo):
+    return [row for row in orderRows() if len(row) >= 7 and accNo in (row[1], row[2])]
+
+
+'''
+The (orderId, due stamp) pairs the log has as done or repeat. Our own
+appends are picked up from the cached rows; a log changed by another
+process is read again.
+'''
+
+def paidDues():
+    try:
+        rows = datacache.rows(LOG_FILE)
+    except FileNotFoundError:
+        rows = []
+    if rows is not paid["rows"]:
+        paid.update(rows=rows, seen=0, keys=set())
+    for row in rows[paid["seen"]:]:
+        if len(row) >= 3 and row[2] in ("done", "repeat"):
+            paid["keys"].add((row[0], row[1]))
+    paid["seen"] = len(rows)
+    return paid["keys"]
+
+
+def inactive(accNo):
+    profile = shards.lookup("CustomerProfiles.txt", accNo)
+    return profile is None or profile.inactive
+
+
+'''
+Makes every transfer due by now (epoch seconds, default the current
+time). Returns how many were done, repeats of ones done before a crash,
+refused, and how long it took.
+'''
+
+def runDue(now=None):
+    start = time.perf_counter()
+    now = int(time.time() if now is None else now)
+    counts = {"done": 0, "repeat": 0, "refused": 0}
+
+    while True:
+        # one hold of the lock per batch, so deposits and transfers from the
+        # menu are not kept waiting for the whole run
+        with dataLock():
+            heap = schedule()
+            if not heap or heap[0][0] > now:
+                break
+            batch = []
+            while heap and heap[0][0] <= now and len(batch) < BATCH_SIZE:
+                due, orderId = heapq.heappop(heap)
+                order = datacache.lookup(STORE_FILE, orderId)
+                # cancelled, or moved on since this entry was pushed
+                if order is None or order[6] != "Active" or int(order[5]) != due:
+                    continue
+                batch.append(order)
+
+            results = {}
+            requests = []
+            done = paidDues()
+            for order in batch:
+                if (order[0], ledger.epochToStamp(int(order[5]))) in done:
+                    # paid before the app stopped; only the order was not moved on
+                    results[order[0]] = None
+                elif inactive(order[1]) or inactive(order[2]):
+                    results[order[0]] = ("refused", "account inactive")
+                else:
+                    requests.append(order)
+            made = transfers.transferMany([(order[1], order[2], float(order[3]), f"SO{order[0]}-{order[5]}")
+                                           for order in requests])
+            results.update(zip([order[0] for order in requests], made))
+
+            changed = {}
+            logRows = []
+            for order in batch:
+                following = nextDue(int(order[5]), order[4], anchorOf(order))
+                changed[order[0]] = order[:5] + [str(following)] + order[6:]
+                if results[order[0]] is None:
+                    counts["repeat"] += 1
+                    continue
+                status, detail = results[order[0]]
+                counts[status] += 1
+                logRows.append([order[0], ledger.epochToStamp(int(order[5])), status,
+                                detail if status == "refused" else ",".join(str(txnId) for txnId in detail)])
+            if changed:
+                before = scheduler["sig"]
+                # the log first: once a due time is in it, it is not paid again
+                if logRows:
+                    datacache.appendRows(LOG_FILE, logRows)
+                datacache.updateRows(STORE_FILE, changed)
+                wrote(before)
+                # a missed due time after this one goes round again
+                for orderId, order in changed.items():
+                    heapq.heappush(heap, (int(order[5]), orderId))
+
+    counts["seconds"] = time.perf_counter() - start
+    return counts
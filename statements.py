@@ -0,0 +1,166 @@
+"""
+Statement Export
+-------------------------------
+
+Writes a CSV statement for every account in one go:
+
+    statements/<period>/<accNo>.csv
+
+The ledger is read once from start to end. Lines are sorted into a
+bucket per account as they come in, and when the buckets together hold
+more than maxRows lines they are appended to the account files and
+emptied, so memory stays the same however big the ledger is.
+
+A running balance is kept for every account so each statement starts
+with its opening balance for the period and ends with its closing
+balance. Account names come from AccountDetails.txt.
+"""
+
+
+import csv
+import os
+import time
+
+import ledger
+import shards
+from metrics import openFile
+
+
+STATEMENT_DIR = "statements"
+MAX_ROWS = 200000
+
+HEADER = ["Date", "Type", "Amount", "Balance", "Transaction Id"]
+
+
+def readNames():
+    names = {}
+    for path in shards.paths("AccountDetails.txt"):
+        with openFile(path, "r") as f:
+            for line in f:
+                parts = line.strip().split("|")
+                if len(parts) == 3:
+                    names[parts[0]] = parts[1]
+    return names
+
+
+class StatementWriter:
+
+    def __init__(self, outDir, names, period, maxRows):
+        self.outDir = outDir
+        self.names = names
+        self.period = period
+        self.maxRows = maxRows
+        self.buckets = {}
+        self.buffered = 0
+        self.started = set()
+        self.spills = 0
+
+    def path(self, accNo):
+        return os.path.join(self.outDir, accNo + ".csv")
+
+    def add(self, accNo, row, openingCents):
+        bucket = self.buckets.get(accNo)
+        if bucket is None:
+            bucket = self.buckets[accNo] = []
+            if accNo not in self.started:
+                bucket.append(("open", openingCents))
+        bucket.append(row)
+        self.buffered += 1
+        if self.buffered >= self.maxRows:
+            self.spill()
+
+    def writeRows(self, f, accNo, rows):
+        writer = csv.writer(f)
+        for row in rows:
+            if isinstance(row, tuple):
+                writer.writerow(["Account", accNo])
+                writer.writerow(["Name", self.names.get(accNo, "")])
+                writer.writerow(["Period", self.period])
+                writer.writerow(["Opening Balance", f"{row[1] / 100:.2f}"])
+                writer.writerow([])
+                writer.writerow(HEADER)
+            else:
+                writer.writerow(row)
+
+    '''
+    Appends every bucket to its account file and empties them.
+    '''
+
+    def spill(self):
+        for accNo, rows in self.buckets.items():
+            with openFile(self.path(accNo), "a", newline="") as f:
+                self.writeRows(f, accNo, rows)
+            self.started.add(accNo)
+        self.buckets = {}
+        self.buffered = 0
+        self.spills += 1
+
+    def finish(self, accNo, openingCents, closingCents):
+        # openingCents is only used for accounts without any line in the period
+        bucket = self.buckets.get(accNo)
+        if bucket is None:
+            bucket = self.buckets[accNo] = []
+            if accNo not in self.started:
+                bucket.append(("open", openingCents))
+        bucket.append([])
+        bucket.append(["Closing Balance", f"{closingCents / 100:.2f}"])
+        self.buffered += 2
+        if self.buffered >= self.maxRows:
+            self.spill()
+
+
+'''
+Exports statements for every account. since and until limit the period
+("YYYY-MM" or "YYYY-MM-DD", either may be None for all of history).
+Returns a small dict with what was written.
+'''
+
+def exportStatements(since=None, until=None, outDir=None, maxRows=MAX_ROWS):
+    start = time.perf_counter()
+    if since and since == until:
+        label = period = since
+    elif since or until:
+        label = f"{since or 'start'}_{until or 'today'}"
+        period = f"{since or 'start'} to {until or 'today'}"
+    else:
+        label, period = "all", "full history"
+    if outDir is None:
+        outDir = os.path.join(STATEMENT_DIR, label)
+    os.makedirs(outDir, exist_ok=True)
+    for name in os.listdir(outDir):
+        if name.endswith(".csv"):
+            os.remove(os.path.join(outDir, name))
+
+    names = readNames()
+    writer = StatementWriter(outDir, names, period, maxRows)
+    sinceEpoch = ledger.periodEpoch(since) if since else None
+
+    # the whole history is read (up to until) so opening balances are right,
+    # only lines inside the period end up on the statements
+    running = {}
+    count = 0
+    for record in ledger.readTransactions(None, until):
+        accNo = record.accNo
+        before = running.get(accNo, 0)
+        after = record.balanceCents if record.balanceCents is not None else before + record.signedCents
+        running[accNo] = after
+        if sinceEpoch is not None and record.epoch < sinceEpoch:
+            continue
+        writer.add(accNo, [record.stamp(), record.label(), f"{record.amount:.2f}", f"{after / 100:.2f}",
+                           record.txnId if record.txnId is not None else ""], before)
+        count += 1
+
+    # accounts with nothing in the period still get a statement
+    accounts = set(names) | set(running)
+    for accNo in accounts:
+        balance = running.get(accNo, 0)
+        writer.finish(accNo, balance, balance)
+    writer.spill()
+
+    return {
+        "accounts": len(accounts),
+        "transactions": count,
+        "spills": writer.spills - 1,
+        "folder": outDir,
+        "seconds": time.perf_counter() - start,
+    }
@@ -0,0 +1,213 @@
+"""
+Daily Summaries
+-------------------------------
+
+A running summary of every account, one file per day:
+
+    summaries/YYYY-MM-DD.txt      accNo|opening|closing|credits|debits
+
+Whenever the ledger gets new transactions, a fresh line is appended for
+each account that moved, holding its totals for the whole day so far.
+The last line for an account in a day file is the one that counts.
+
+That makes "balance as of a date" and monthly statements a walk over
+day files (O(days)) instead of a replay of the entire ledger.
+
+Snapshots hard-link the files of past days (see snapshots.py). Before
+appending to a day file that is linked like that, it is copied first,
+so the snapshot keeps its own version.
+"""
+
+
+import bisect
+import os
+import shutil
+
+from metrics import openFile
+from tailer import LogTail
+
+
+SUMMARY_DIR = "summaries"
+
+# day files are append-only, so today's file is followed with a LogTail
+# and only the lines added since the last look are parsed
+dayCache = {"day": None, "tail": None, "rows": {}}
+
+
+def dayPath(day):
+    return os.path.join(SUMMARY_DIR, day + ".txt")
+
+
+def parseRow(line):
+    parts = line.strip().split("|")
+    if len(parts) != 5:
+        return None
+    try:
+        return parts[0], [float(parts[1]), float(parts[2]), float(parts[3]), float(parts[4])]
+    except ValueError:
+        return None
+
+
+'''
+Reads a whole day file into {accNo: [opening, closing, credits, debits]}.
+'''
+
+def readDay(day):
+    rows = {}
+    try:
+        with openFile(dayPath(day), "r") as f:
+            for line in f:
+                parsed = parseRow(line)
+                if parsed:
+                    rows[parsed[0]] = parsed[1]
+    except FileNotFoundError:
+        pass
+    return rows
+
+
+def currentRows(day):
+    if dayCache["day"] != day:
+        dayCache["day"] = day
+        dayCache["tail"] = LogTail(dayPath(day))
+        dayCache["rows"] = {}
+
+    newLines, reset = dayCache["tail"].poll()
+    if reset:
+        dayCache["rows"] = {}
+    rows = dayCache["rows"]
+    for line in newLines:
+        parsed = parseRow(line)
+        if parsed:
+            rows[parsed[0]] = parsed[1]
+    return rows
+
+
+'''
+Makes sure a day file is not shared with a snapshot before writing to
+it: a hard-linked file is replaced by a copy of its own.
+'''
+
+def unshare(path):
+    try:
+        if os.stat(path).st_nlink < 2:
+            return
+    except FileNotFoundError:
+        return
+    tempPath = path + ".tmp"
+    shutil.copyfile(path, tempPath)
+    os.replace(tempPath, path)
+
+
+'''
+Folds new ledger movements into the day summaries.
+Each movement is (accNo, "YYYY-MM-DD", signed amount, balance after).
+'''
+
+def recordMovements(movements):
+    if not movements:
+        return
+    os.makedirs(SUMMARY_DIR, exist_ok=True)
+
+    byDay = {}
+    for movement in movements:
+        byDay.setdefault(movement[1], []).append(movement)
+
+    for day, dayMovements in byDay.items():
+        rows = currentRows(day)
+        out = []
+        for accNo, _, amount, balance in dayMovements:
+            row = rows.get(accNo)
+            if row is None:
+                row = rows[accNo] = [round(balance - amount, 2), balance, 0.0, 0.0]
+            row[1] = balance
+            if amount >= 0:
+                row[2] = round(row[2] + amount, 2)
+            else:
+                row[3] = round(row[3] - amount, 2)
+            out.append(f"{accNo}|{row[0]:.2f}|{row[1]:.2f}|{row[2]:.2f}|{row[3]:.2f}\n")
+
+        unshare(dayPath(day))
+        with openFile(dayPath(day), "a") as f:
+            f.write("".join(out))
+        # read our own lines back through the tail so it stays in step
+        currentRows(day)
+
+
+def summaryDays():
+    try:
+        names = os.listdir(SUMMARY_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-4] for name in names if name.endswith(".txt") and len(name) == 14)
+
+
+'''
+Closing balance of an account at the end of the given day, taken from
+the newest day file on or before it that mentions the account.
+Returns None if the account has no summary up to that day.
+'''
+
+def balanceAsOf(accNo, day):
+    days = summaryDays()
+    index = bisect.bisect_right(days, day)
+    while index > 0:
+        index -= 1
+        row = readDay(days[index]).get(accNo)
+        if row is not None:
+            return row[1]
+    return None
+
+
+'''
+The days of one month for one account: a list of
+[day, opening, credits, debits, closing], plus the month totals.
+Days without any activity are left out.
+'''
+
+def monthSummary(accNo, month):
+    rows = []
+    for day in summaryDays():
+        if not day.startswith(month):
+            continue
+        row = readDay(day).get(accNo)
+        if row is not None:
+            rows.append([day, row[0], row[2], row[3], row[1]])
+
+    if not rows:
+        opening = balanceAsOf(accNo, month + "-00")
+        return rows, {"opening": opening, "closing": opening, "credits": 0.0, "debits": 0.0}
+
+    totals = {
+        "opening": rows[0][1],
+        "closing": rows[-1][4],
+        "credits": round(sum(row[2] for row in rows), 2),
+        "debits": round(sum(row[3] for row in rows), 2),
+    }
+    return rows, totals
+
+
+'''
+Throws the summaries away and rebuilds them from a stream of
+(accNo, day, signed amount) ledger movements, keeping a running
+balance per account that starts at zero.
+'''
+
+def rebuild(movements):
+    if os.path.isdir(SUMMARY_DIR):
+        for name in os.listdir(SUMMARY_DIR):
+            os.remove(os.path.join(SUMMARY_DIR, name))
+    dayCache["day"] = None
+
+    balances = {}
+    batch = []
+    count = 0
+    for accNo, day, amount in movements:
+        balance = round(balances.get(accNo, 0.0) + amount, 2)
+        balances[accNo] = balance
+        if batch and batch[-1][1] != day:
+            recordMovements(batch)
+            batch = []
+        batch.append((accNo, day, amount, balance))
+        count += 1
+    recordMovements(batch)
+    return count
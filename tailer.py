@@ -0,0 +1,83 @@
+"""
+Log Tailing
+-------------------------------
+
+transactions.txt, interestlog.txt, change_log.txt and
+deactivation_log.txt only ever grow at the end, so anything built from
+them (caches, indexes, summaries) only needs to read what was added
+since it last looked.
+
+A LogTail remembers how far into its file it has read and hands back
+just the complete lines added since. It starts over from the beginning
+(and says so) when the file was:
+
+- replaced by a new file (different inode, e.g. the ledger was rotated)
+- truncated (smaller than where we stopped)
+- rewritten (the bytes just before where we stopped are different)
+
+A line that is still being written (no newline yet) is left for the
+next poll.
+"""
+
+
+import os
+
+from metrics import openFile
+
+
+MARK_SIZE = 64
+
+
+class LogTail:
+
+    def __init__(self, path):
+        self.path = path
+        self.inode = None
+        self.offset = 0
+        self.mark = b""
+
+    def reset(self):
+        self.inode = None
+        self.offset = 0
+        self.mark = b""
+
+    def unchanged(self, f):
+        if not self.mark:
+            return True
+        f.seek(self.offset - len(self.mark))
+        return f.read(len(self.mark)) == self.mark
+
+    '''
+    Returns (new lines, reset). When reset is True the lines are the
+    whole file and whatever was built from earlier lines should be
+    thrown away. A missing file gives ([], True).
+    '''
+
+    def poll(self):
+        try:
+            info = os.stat(self.path)
+        except FileNotFoundError:
+            self.reset()
+            return [], True
+
+        fresh = info.st_ino != self.inode or info.st_size < self.offset
+        if not fresh and info.st_size == self.offset:
+            return [], False
+
+        with openFile(self.path, "rb") as f:
+            if not fresh and not self.unchanged(f):
+                fresh = True
+            if fresh:
+                self.offset = 0
+                self.mark = b""
+            self.inode = os.fstat(f.fileno()).st_ino
+            f.seek(self.offset)
+            data = f.read()
+
+        end = data.rfind(b"\n") + 1
+        if not end:
+            return [], fresh
+
+        self.offset += end
+        self.mark = (self.mark + data[:end])[-MARK_SIZE:]
+        return data[:end].decode().splitlines(keepends=True), fresh
@@ -0,0 +1,138 @@
+"""
+Terminal
+-------------------------------
+
+Text colours and screen drawing for the banking app.
+
+The colour codes are the same ANSI codes colorama hands out. On Windows
+colorama is still loaded so the console understands them. Other
+terminals understand them already, so instead of importing colorama
+(which takes longer than starting the rest of the app) we do its
+autoreset job ourselves:
+
+- the colour is reset after every write, so one coloured message
+  never bleeds into the next line
+- colour codes are removed when the output is not a terminal
+  (a file or a pipe), just like colorama does
+
+Screens are drawn with as few writes as possible: the screen is cleared
+with an escape code instead of running "clear" in a new shell, banners
+and menu tables are rendered once and cached, and a whole screen goes
+out in a single write (see render).
+"""
+
+
+import functools
+import os
+import sys
+
+
+class Fore:
+    BLACK = "\033[30m"
+    RED = "\033[31m"
+    GREEN = "\033[32m"
+    YELLOW = "\033[33m"
+    BLUE = "\033[34m"
+    MAGENTA = "\033[35m"
+    CYAN = "\033[36m"
+    WHITE = "\033[37m"
+    RESET = "\033[39m"
+
+
+RESET_ALL = "\033[0m"
+
+# cursor home + clear screen (+ clear scrollback, which the Windows console does not know)
+if os.name == "nt":
+    CLEAR_SCREEN = "\033[2J\033[H"
+else:
+    CLEAR_SCREEN = "\033[H\033[2J\033[3J"
+
+CODES = [value for name, value in vars(Fore).items() if name.isupper()] + [RESET_ALL, CLEAR_SCREEN]
+
+BANNER_WIDTH = 82
+BANNER_EDGE = "\t" + "_" * (BANNER_WIDTH + 1)
+BANNER_BLANK = "\t|" + " " * BANNER_WIDTH + "|"
+
+
+'''
+Stands in for sys.stdout and resets the colour after each write
+(or strips the colours if the output is not a terminal).
+'''
+
+class AutoResetStream:
+
+    def __init__(self, stream):
+        self.stream = stream
+        try:
+            self.strip = not stream.isatty()
+        except (AttributeError, ValueError):
+            self.strip = True
+
+    def write(self, text):
+        if self.strip:
+            if "\033[" in text:
+                for code in CODES:
+                    text = text.replace(code, "")
+            return self.stream.write(text)
+
+        written = self.stream.write(text)
+        self.stream.write(RESET_ALL)
+        return written
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def init(autoreset=False):
+    if os.name == "nt":
+        import colorama
+        colorama.init(autoreset=autoreset)
+        return
+
+    if autoreset and not isinstance(sys.stdout, AutoResetStream):
+        sys.stdout = AutoResetStream(sys.stdout)
+
+
+'''
+Builds the boxed heading every screen starts with. The result is cached,
+so each banner is only put together once per run.
+'''
+
+@functools.lru_cache(maxsize=None)
+def banner(title, color=Fore.CYAN):
+    fill = min(17, (BANNER_WIDTH - len(title) - 6) // 2)
+    heading = "=" * fill + " " + title + " " + "=" * (fill + 1)
+    lines = [
+        BANNER_EDGE,
+        BANNER_BLANK,
+        "\t|" + heading.center(BANNER_WIDTH) + "|",
+        BANNER_BLANK,
+        BANNER_EDGE,
+        "",
+    ]
+    return color + "\n".join(lines) + RESET_ALL + "\n"
+
+
+'''
+Renders a menu (a tuple of (option, description) pairs) as an indented
+table. Menus never change, so each one is only drawn by tabulate once.
+'''
+
+@functools.lru_cache(maxsize=None)
+def menuTable(options, indent="\t\t\t\t"):
+    from tabulate import tabulate
+    table = tabulate([list(option) for option in options], headers=["Option", "Description"], tablefmt="fancy_grid")
+    return "".join(indent + line + "\n" for line in table.split("\n"))
+
+
+'''
+Writes all the given pieces to the screen in one go.
+'''
+
+def render(*parts):
+    sys.stdout.write("".join(parts))
+    sys.stdout.flush()
+
+
+def clearScreen():
+    render(CLEAR_SCREEN)
@@ -0,0 +1,73 @@
+"""
+Test Setup
+-------------------------------
+
+Every test runs in a fresh copy of the sample data files (the *.txt at
+the top of the repo) in its own temporary folder, with the in-memory
+caches emptied, so tests never touch the repo's own data or each other.
+"""
+
+
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import banking_app
+import datacache
+import idempotency
+import locking
+import screening
+import standingorders
+import summaries
+
+
+DATA_FILES = ["AccountDetails.txt", "CustomerProfiles.txt", "credentials.txt", "transactions.txt",
+              "change_log.txt", "deactivation_log.txt", "interestlog.txt"]
+
+
+def resetCaches():
+    datacache.invalidate()
+    summaries.dayCache["day"] = None
+    idempotency.cache.clear()
+    idempotency.journal.reset()
+    screening.state.update(rules=None, source=None, accounts={}, added=0)
+    screening.tail.reset()
+    standingorders.scheduler.update(sig=None, heap=[])
+    standingorders.paid.update(rows=None, seen=0, keys=set())
+    locking.readOnly = False
+
+
+@pytest.fixture
+def bank(tmp_path, monkeypatch):
+    for name in DATA_FILES:
+        shutil.copy(os.path.join(ROOT, name), tmp_path / name)
+    monkeypatch.chdir(tmp_path)
+    resetCaches()
+    yield tmp_path
+    resetCaches()
+
+
+'''
+Runs a menu function with scripted answers to its input() prompts.
+'''
+
+def run(func, *args, answers=()):
+    answers = iter(answers)
+    original = banking_app.input if "input" in vars(banking_app) else None
+    banking_app.input = lambda prompt="": next(answers)
+    try:
+        return func(*args)
+    finally:
+        if original is None:
+            del banking_app.input
+        else:
+            banking_app.input = original
+
+
+def balance(accNo):
+    return banking_app.shards.lookup("AccountDetails.txt", accNo).balance
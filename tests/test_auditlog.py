@@ -0,0 +1,13 @@
+import auditlog
+
+
+def test_log_left_renamed_by_a_cut_short_rotation_is_archived(bank):
+    auditlog.logChange("2006", "Name", "A", "B")
+    (bank / "change_log.txt").rename(bank / "change_log.txt.rotating")
+    auditlog.logChange("2006", "Name", "B", "C")
+
+    auditlog.rotate("change")
+    assert not (bank / "change_log.txt.rotating").exists()
+    assert not (bank / "change_log.txt").exists()
+    changes = [entry["new"] for entry in auditlog.history("2006") if entry["event"] == "change"]
+    assert changes[-2:] == ["B", "C"]
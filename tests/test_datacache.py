@@ -0,0 +1,30 @@
+import datacache
+
+
+def test_lookup_in_a_file_over_budget_scans(bank, monkeypatch):
+    cached = datacache.lookup("AccountDetails.txt", "2010")
+    datacache.invalidate()
+    monkeypatch.setattr(datacache, "budget", 100)
+
+    found = datacache.lookup("AccountDetails.txt", "2010")
+    assert (found.accNo, found.balance) == (cached.accNo, cached.balance)
+    assert datacache.lookup("AccountDetails.txt", "9999") is None
+    assert datacache.lookup("credentials.txt", "user2006")[2] == "user"
+    assert datacache.stats["scans"] >= 3
+    assert not datacache.entries
+
+
+def test_update_in_a_file_over_budget_rewrites_it_line_by_line(bank, monkeypatch):
+    before = list(datacache.rows("AccountDetails.txt"))
+    datacache.invalidate()
+    monkeypatch.setattr(datacache, "budget", 100)
+
+    changed = before[3].withBalance(before[3].balance + 100)
+    datacache.updateRows("AccountDetails.txt", {changed.accNo: changed})
+    assert not datacache.entries
+
+    monkeypatch.setattr(datacache, "budget", 256 * 1024 * 1024)
+    after = datacache.rows("AccountDetails.txt")
+    assert [row.accNo for row in after] == [row.accNo for row in before]
+    assert after[3].balance == before[3].balance + 100
+    assert after[:3] + after[4:] == before[:3] + before[4:]
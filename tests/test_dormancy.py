@@ -0,0 +1,18 @@
+import banking_app
+import ledger
+import metrics
+import shards
+from conftest import balance
+
+
+def test_dormancy_job_with_metrics_on(bank, monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    # the sample ledger is from 2025; one fresh deposit keeps 2006 active
+    ledger.appendTransactions([ledger.Transaction.create("2006", "DEP", 10, balance("2006") + 10)])
+
+    banking_app.runJob(banking_app.parseArguments(["--job", "dormancy", "--months", "12"]))
+
+    profiles = {profile.accNo: profile for profile in shards.rows("CustomerProfiles.txt")}
+    assert not profiles["2006"].inactive
+    assert all(profile.inactive for accNo, profile in profiles.items() if accNo != "2006")
+    assert metrics.files[("transactions.txt", "read")].opens >= 1
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+import ledger
+from locking import dataLock
+
+
+def allLines():
+    return [record.stamp() for record in ledger.readTransactions()]
+
+
+def test_blank_first_line_still_rotates(bank):
+    with open("transactions.txt") as f:
+        text = f.read()
+    with open("transactions.txt", "w") as f:
+        f.write("\n" + text)
+
+    assert ledger.activeMonth() == "2025-05"
+    with dataLock():
+        ledger.appendTransactions([ledger.Transaction.create("2006", "DEP", 10, 230585.00)])
+    assert os.path.exists(os.path.join(ledger.LEDGER_DIR, ledger.segmentName("2025-05")))
+    assert ledger.activeMonth() == ledger.currentMonth()
+
+
+def test_rotation_cut_short_is_finished_without_duplicates(bank, monkeypatch):
+    before = allLines()
+    realReplace = os.replace
+
+    def stopAtActiveFile(source, target):
+        if target == ledger.ACTIVE_FILE:
+            raise KeyboardInterrupt
+        realReplace(source, target)
+
+    monkeypatch.setattr(os, "replace", stopAtActiveFile)
+    with pytest.raises(KeyboardInterrupt):
+        ledger.rotateLedger()
+    monkeypatch.setattr(os, "replace", realReplace)
+
+    with dataLock():
+        pass
+    assert not os.path.exists(ledger.ROTATION_FILE)
+    assert allLines() == before
+    assert ledger.readIndex()[0][3] == len(before)
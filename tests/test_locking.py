@@ -0,0 +1,51 @@
+import fcntl
+
+import pytest
+
+import locking
+from locking import dataLock
+
+
+def heldBy(mode):
+    # True if another open of bank.lock cannot take the lock in this mode
+    with open(locking.LOCK_FILE, "a") as other:
+        try:
+            fcntl.flock(other, mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(other, fcntl.LOCK_UN)
+        return False
+
+
+def test_lock_can_be_taken_again_while_held(bank):
+    with dataLock():
+        with dataLock():
+            assert locking.state["depth"] == 2
+            assert heldBy(fcntl.LOCK_SH)
+        assert locking.state["depth"] == 1
+        assert heldBy(fcntl.LOCK_SH)
+    assert locking.state["depth"] == 0
+    assert not heldBy(fcntl.LOCK_EX)
+
+
+def test_exclusive_inside_shared_is_refused(bank):
+    with dataLock(shared=True):
+        with pytest.raises(locking.LockUpgrade):
+            with dataLock():
+                pass
+        # still held shared, as before the refused request
+        assert locking.state["shared"] and locking.state["depth"] == 1
+        assert not heldBy(fcntl.LOCK_SH)
+        assert heldBy(fcntl.LOCK_EX)
+        with dataLock(shared=True):
+            assert locking.state["depth"] == 2
+    assert not heldBy(fcntl.LOCK_EX)
+
+
+def test_lock_is_let_go_after_an_error(bank):
+    with pytest.raises(RuntimeError):
+        with dataLock():
+            with dataLock():
+                raise RuntimeError("boom")
+    assert locking.state["depth"] == 0
+    assert not heldBy(fcntl.LOCK_EX)
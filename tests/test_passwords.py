@@ -0,0 +1,38 @@
+import banking_app
+import datacache
+import locking
+from conftest import run
+
+
+def scriptedPasswords(monkeypatch, answers):
+    answers = iter(answers)
+    monkeypatch.setattr(banking_app, "readPassword", lambda prompt: next(answers))
+    monkeypatch.setattr(banking_app, "check_password", lambda password, hashed: password == "old")
+    monkeypatch.setattr(banking_app, "hash_password", lambda password: "hashed-" + password)
+
+
+def test_change_password_writes_under_the_lock(bank, monkeypatch):
+    scriptedPasswords(monkeypatch, ["old", "new", "new"])
+    updateRows = datacache.updateRows
+    held = []
+    monkeypatch.setattr(datacache, "updateRows",
+                        lambda *args: held.append(locking.state["depth"]) or updateRows(*args))
+
+    run(banking_app.changePassword, "user2006")
+
+    assert held == [1]
+    assert datacache.lookup("credentials.txt", "user2006")[1] == "hashed-new"
+
+
+def test_change_password_made_meanwhile_is_not_overwritten(bank, monkeypatch):
+    scriptedPasswords(monkeypatch, ["old", "new", "new"])
+
+    def hashMeanwhile(password):
+        # another session changes the password while this one is hashing
+        datacache.updateRows("credentials.txt", {"user2006": ["user2006", "theirs", "user"]})
+        return "hashed-" + password
+    monkeypatch.setattr(banking_app, "hash_password", hashMeanwhile)
+
+    run(banking_app.changePassword, "user2006")
+
+    assert datacache.lookup("credentials.txt", "user2006")[1] == "theirs"
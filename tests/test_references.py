@@ -0,0 +1,13 @@
+import banking_app
+from conftest import balance, run
+
+
+def test_reference_reused_for_another_movement_is_refused(bank, capsys):
+    run(banking_app.deposit, "admin", answers=["2006", "100", "slip-1"])
+    capsys.readouterr()
+
+    run(banking_app.withdraw, "admin", answers=["2006", "100", "slip-1"])
+    assert "Withdrawal refused: reference slip-1 was already used for a different transaction." in capsys.readouterr().out
+    run(banking_app.deposit, "admin", answers=["2006", "50", "slip-1"])
+    assert "Deposit refused: reference slip-1 was already used" in capsys.readouterr().out
+    assert balance("2006") == 230675.00
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import replication
+from conftest import resetCaches
+
+
+class FailingTransport(replication.LocalTransport):
+
+    def send(self, seq, header, payload):
+        raise OSError("the replica folder went away")
+
+
+def applyIn(replicaDir, transport):
+    cwd = os.getcwd()
+    os.chdir(replicaDir)
+    resetCaches()
+    try:
+        return replication.applyPending(transport)
+    finally:
+        os.chdir(cwd)
+        resetCaches()
+
+
+def test_batch_lost_in_a_crash_is_sent_again_unchanged(bank):
+    replicaDir = bank / "replica"
+    transport = replication.LocalTransport(str(replicaDir))
+    assert replication.ship(transport)["seq"] == 1
+
+    with open("change_log.txt", "a") as f:
+        f.write("one more line\n")
+    with pytest.raises(OSError):
+        replication.ship(FailingTransport(str(replicaDir)))
+    with open("change_log.txt", "a") as f:
+        f.write("and another\n")
+
+    # batch 2 goes out as it was, the new line comes in batch 3
+    assert replication.ship(transport)["seq"] == 3
+    transport = replication.LocalTransport(".")
+    assert applyIn(replicaDir, transport)["seq"] == 3
+    with open(replicaDir / "change_log.txt") as f, open("change_log.txt") as g:
+        assert f.read() == g.read()
+
+
+def test_same_batch_number_with_other_changes_is_refused(bank):
+    replicaDir = bank / "replica"
+    transport = replication.LocalTransport(str(replicaDir))
+    replication.ship(transport)
+    header, payload = replication.readBatch(transport.pending()[0])
+    applyIn(replicaDir, replication.LocalTransport("."))
+
+    header["ops"] = header["ops"][1:]
+    transport.send(1, header, payload)
+    with pytest.raises(replication.ReplicationError):
+        applyIn(replicaDir, replication.LocalTransport("."))
@@ -0,0 +1,32 @@
+import time
+
+import banking_app
+import standingorders
+from conftest import balance, run
+
+
+def test_large_withdrawal_goes_through_the_default_rules(bank):
+    run(banking_app.withdraw, "admin", answers=["2006", "150000", ""])
+    assert balance("2006") == 80575.00
+
+
+def test_default_rules_refuse_a_drain(bank):
+    for reference in range(11):
+        run(banking_app.withdraw, "admin", answers=["2006", "100", f"r{reference}"])
+    assert balance("2006") == 229575.00
+
+
+def test_rules_file_refuses_a_drain(bank):
+    (bank / "screening_rules.txt").write_text("60|2|1000000\n")
+    for reference in ("a", "b", "c"):
+        run(banking_app.withdraw, "admin", answers=["2006", "100", reference])
+    assert balance("2006") == 230375.00
+
+
+def test_standing_orders_are_screened(bank):
+    (bank / "screening_rules.txt").write_text("60|1|1000000\n")
+    for toAcc in ("2007", "2008", "2010"):
+        standingorders.addOrder("2006", toAcc, 100, "monthly", time.time() - 10)
+    counts = standingorders.runDue()
+    assert (counts["done"], counts["refused"]) == (1, 2)
+    assert balance("2006") == 230475.00
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+import banking_app
+import locking
+import searchindex
+import shards
+from locking import dataLock
+
+
+@pytest.fixture
+def index(bank):
+    searchindex.state.update(fields=None, sig=None, pending=0)
+    searchindex.journal.reset()
+    yield
+    searchindex.state.update(fields=None, sig=None, pending=0)
+    searchindex.journal.reset()
+
+
+def renamed(accNo, name):
+    profile = shards.lookup("CustomerProfiles.txt", accNo)
+    updated = profile.replace(name=name)
+    assert banking_app.commitProfile(accNo, profile, updated, lambda: None) == "saved"
+    return updated
+
+
+def test_profile_edit_before_any_search_is_not_lost(index, monkeypatch):
+    renamed("2010", "ZUBAIR")
+    assert searchindex.search("name", "ZUBAIR")[0][1] == "2010"
+    assert os.path.exists(searchindex.INDEX_FILE)
+
+    # later edits come from the journal, without building the index again
+    monkeypatch.setattr(searchindex, "build", lambda: pytest.fail("built again"))
+    renamed("2011", "QUENTIN")
+    assert searchindex.search("name", "QUENTIN")[0][1] == "2011"
+
+
+def test_search_inside_a_shared_hold_does_not_write(index):
+    with dataLock(shared=True):
+        assert searchindex.search("name", "MUNSI")[0][1] == "2011"
+    assert not os.path.exists(searchindex.INDEX_FILE)
+    # the next search outside it writes the index out
+    searchindex.search("name", "MUNSI")
+    assert os.path.exists(searchindex.INDEX_FILE)
+
+
+def test_read_only_replica_keeps_the_index_in_memory(index, monkeypatch):
+    monkeypatch.setattr(locking, "readOnly", True)
+    assert searchindex.search("name", "MUNSI")[0][1] == "2011"
+    assert not os.path.exists(searchindex.INDEX_FILE)
@@ -0,0 +1,81 @@
+import datetime
+import os
+import time
+
+import banking_app
+import ledger
+import snapshots
+import summaries
+from conftest import balance, run
+
+
+def interestLines():
+    return [record for record in ledger.readTransactions() if record.code == "INT"]
+
+
+def test_restore_does_not_pay_interest_twice(bank):
+    snapshots.takeSnapshot()
+    banking_app.applyMonthlyInterest()
+    paid = len(interestLines())
+    afterInterest = balance("2006")
+
+    snapshots.restore()
+    assert balance("2006") == afterInterest
+
+    banking_app.applyMonthlyInterest()
+    assert len(interestLines()) == paid
+    assert balance("2006") == afterInterest
+
+
+def test_restore_leaves_snapshot_summaries_alone(bank, monkeypatch):
+    yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+    epoch = ledger.periodEpoch(yesterday) + 3600
+    opening = balance("2006")
+    ledger.appendTransactions([ledger.Transaction.create("2006", "DEP", 10, opening + 10, epoch=epoch)])
+
+    # a snapshot taken early yesterday, so yesterday's file is linked into it
+    with monkeypatch.context() as patch:
+        patch.setattr(time, "time", lambda: epoch + 60)
+        manifest = snapshots.takeSnapshot()
+    dayFile = os.path.join(summaries.SUMMARY_DIR, yesterday + ".txt")
+    assert manifest["files"][dayFile] == "link"
+    snapshotCopy = os.path.join(manifest["folder"], dayFile)
+    with open(snapshotCopy) as f:
+        before = f.read()
+
+    # made after the snapshot, so the restore replays it into yesterday's file
+    ledger.appendTransactions([ledger.Transaction.create("2006", "DEP", 5, opening + 15, epoch=epoch + 120)])
+    snapshots.restore()
+
+    with open(snapshotCopy) as f:
+        assert f.read() == before
+    assert summaries.readDay(yesterday)["2006"][1] == opening + 15
+
+
+def test_reference_is_remembered_after_restore(bank):
+    snapshots.takeSnapshot()
+    run(banking_app.deposit, "admin", answers=["2006", "500", "slip-1"])
+    afterDeposit = balance("2006")
+
+    snapshots.restore()
+    assert balance("2006") == afterDeposit
+
+    # the teller retries the same slip
+    run(banking_app.deposit, "admin", answers=["2006", "500", "slip-1"])
+    assert balance("2006") == afterDeposit
+
+
+def test_reference_of_an_undone_deposit_can_be_used_again(bank, monkeypatch):
+    now = time.time()
+    with monkeypatch.context() as patch:
+        patch.setattr(time, "time", lambda: now - 100)
+        snapshots.takeSnapshot()
+    opening = balance("2006")
+    run(banking_app.deposit, "admin", answers=["2006", "500", "slip-1"])
+
+    # back to before the deposit
+    snapshots.restore(now - 50)
+    assert balance("2006") == opening
+
+    run(banking_app.deposit, "admin", answers=["2006", "500", "slip-1"])
+    assert balance("2006") == opening + 500
@@ -0,0 +1,55 @@
+import time
+
+import datacache
+import idempotency
+import ledger
+import locking
+import standingorders
+from conftest import balance
+
+
+def test_due_orders_take_the_lock_per_batch(bank, monkeypatch):
+    for toAcc in ("2007", "2008", "2010", "2011", "2012"):
+        standingorders.addOrder("2006", toAcc, 100, "monthly", time.time() - 10)
+    monkeypatch.setattr(standingorders, "BATCH_SIZE", 2)
+    holds = []
+    dataLock = standingorders.dataLock
+
+    def countedLock(*args, **kwargs):
+        # the depth before taking it: 0 means the lock was not held
+        holds.append(locking.state["depth"])
+        return dataLock(*args, **kwargs)
+    monkeypatch.setattr(standingorders, "dataLock", countedLock)
+
+    counts = standingorders.runDue()
+
+    assert counts["done"] == 5
+    assert balance("2006") == 230075.00
+    # three batches and the look that finds nothing more due, none nested
+    assert holds == [0, 0, 0, 0]
+    assert standingorders.runDue()["done"] == 0
+
+
+def test_monthly_order_keeps_its_day_after_a_short_month(bank):
+    january31 = ledger.periodEpoch("2026-01-31") + 9 * 3600
+    february = standingorders.nextDue(january31, "monthly", january31)
+    march = standingorders.nextDue(february, "monthly", january31)
+    assert ledger.epochToStamp(february) == "2026-02-28 09:00:00"
+    assert ledger.epochToStamp(march) == "2026-03-31 09:00:00"
+
+
+def test_due_time_in_the_log_is_not_paid_again(bank, monkeypatch):
+    due = int(time.time()) - 10
+    orderId = standingorders.addOrder("2006", "2007", 100, "monthly", due)
+    assert standingorders.runDue()["done"] == 1
+
+    # the app stopped after the log line, before the order was moved on,
+    # and came back after the references had expired
+    order = datacache.lookup(standingorders.STORE_FILE, orderId)
+    datacache.updateRows(standingorders.STORE_FILE, {orderId: order[:5] + [str(due)] + order[6:]})
+    standingorders.scheduler.update(sig=None, heap=[])
+    idempotency.cache.clear()
+    monkeypatch.setattr(idempotency, "lookup", lambda *args: None)
+
+    assert standingorders.runDue()["repeat"] == 1
+    assert balance("2006") == 230475.00
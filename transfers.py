@@ -0,0 +1,117 @@
+"""
+Transfers
+-------------------------------
+
+The part of a transfer that moves the money, shared by the Transfer
+Money menu option and the standing orders (see standingorders.py):
+
+- a reference already used for the same transfer gives back the first
+  result (see idempotency.py)
+- the sender needs the money, and has to pass the velocity checks
+  (see screening.py)
+- both balances and the two ledger lines are written
+
+transferMany does a whole batch under one hold of the data lock: the
+transfers are checked one after the other against the balances the
+earlier ones left, and then AccountDetails.txt is written once and the
+ledger appended to once, however many there are.
+
+Each transfer comes back as one of
+
+    ("done", [transaction ids])
+    ("repeat", [transaction ids])   the reference was done before
+    ("refused", reason)
+"""
+
+
+import time
+
+import idempotency
+import ledger
+import screening
+import shards
+from locking import dataLock
+from records import toCents
+
+
+ACCOUNTS = "AccountDetails.txt"
+
+
+'''
+Moves the money for a list of (fromAcc, toAcc, amount, reference)
+tuples and returns one result per tuple, in the same order.
+'''
+
+def transferMany(requests):
+    results = []
+    working = {}            # accNo -> account as the batch has left it
+    debits = {}             # accNo -> cents taken out earlier in the batch
+    transactions = []
+    remembered = []         # (reference, op, the transactions it made)
+    batchRefs = {}          # reference -> (op, position in results)
+
+    with dataLock():
+        now = int(time.time())
+        for fromAcc, toAcc, amount, reference in requests:
+            op = f"XFER|{fromAcc}|{toAcc}|{toCents(amount)}"
+            if reference in batchRefs:
+                usedFor, position = batchRefs[reference]
+                results.append(("repeat", position) if usedFor == op else
+                               ("refused", f"reference {reference} was already used for a different transaction"))
+                continue
+            try:
+                done = idempotency.lookup(reference, op)
+            except idempotency.ReusedReference as e:
+                results.append(("refused", str(e)))
+                continue
+            if done is not None:
+                results.append(("repeat", done))
+                continue
+
+            sender = working.get(fromAcc) or shards.lookup(ACCOUNTS, fromAcc)
+            receiver = working.get(toAcc) or shards.lookup(ACCOUNTS, toAcc)
+            if sender is None or receiver is None:
+                results.append(("refused", f"{'sender' if sender is None else 'receiver'} account not found"))
+                continue
+            if fromAcc == toAcc:
+                results.append(("refused", "cannot transfer to the same account"))
+                continue
+            if amount > sender.balance:
+                results.append(("refused", "insufficient balance"))
+                continue
+            problem = screening.check(fromAcc, amount, debits.get(fromAcc, ()))
+            if problem:
+                results.append(("refused", problem))
+                continue
+
+            working[fromAcc] = sender = sender.withBalance(sender.balance - amount)
+            working[toAcc] = receiver = receiver.withBalance(receiver.balance + amount)
+            debits.setdefault(fromAcc, []).append(toCents(amount))
+            made = [
+                ledger.Transaction.create(fromAcc, "XOUT", amount, sender.balance, toAcc, now),
+                ledger.Transaction.create(toAcc, "XIN", amount, receiver.balance, fromAcc, now),
+            ]
+            transactions.extend(made)
+            if reference:
+                batchRefs[reference] = (op, len(results))
+                remembered.append((reference, op, made))
+            results.append(("done", made))
+
+        if transactions:
+            shards.updateRows(ACCOUNTS, working)
+            ledger.appendTransactions(transactions)
+        for reference, op, made in remembered:
+            idempotency.remember(reference, op, [transaction.txnId for transaction in made])
+
+    # the ids are only handed out when the ledger is written
+    for position, (status, detail) in enumerate(results):
+        if status == "done":
+            results[position] = ("done", [transaction.txnId for transaction in detail])
+    for position, (status, detail) in enumerate(results):
+        if status == "repeat" and isinstance(detail, int):
+            results[position] = ("repeat", results[detail][1])
+    return results
+
+
+def transfer(fromAcc, toAcc, amount, reference=None):
+    return transferMany([(fromAcc, toAcc, amount, reference)])[0]
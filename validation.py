@@ -0,0 +1,55 @@
+"""
+Validation
+-------------------------------
+
+The checks for customer details, shared by the prompts in
+banking_app.py and the batch profile changes in profilebatch.py.
+"""
+
+
+import datetime
+
+
+'''
+Checks one value. Returns (cleaned value, None) when it is fine, or
+(None, message) when it is not.
+'''
+
+def checkValue(value, fieldName, validationType=None):
+    value = value.strip()
+
+    if value == "":
+        return None, f"Oops! {fieldName} can't be empty. Try again."
+
+    if validationType == "nic":
+        if len(value) == 10:
+            if not value[:9].isdigit() or value[-1].upper() not in ['V', 'X']:
+                return None, "Invalid NIC! Should be 9 digits and end with V or X."
+        elif len(value) == 12:
+            if not value.isdigit():
+                return None, "NIC with 12 characters must have only numbers."
+        else:
+            return None, "NIC must be either 10 or 12 characters long."
+
+    elif validationType == "dob":
+        try:
+            datetime.datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            return None, "Date format should be YYYY-MM-DD (e.g., 2000-01-01)."
+
+    elif validationType == "phone":
+        if not value.isdigit() or len(value) != 10:
+            return None, "Phone number must have exactly 10 digits."
+
+    elif validationType == "email":
+        if "@" not in value or "." not in value:
+            return None, "Invalid email. Must contain '@' and a domain."
+        if value.startswith("@") or value.endswith("@") or ".." in value:
+            return None, "Email looks wrong. Check the format again."
+
+    elif validationType == "gender":
+        if value.lower() not in ["male", "female"]:
+            return None, "Please enter Male or Female only."
+        return value.capitalize(), None
+
+    return value, None